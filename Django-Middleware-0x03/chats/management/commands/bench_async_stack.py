@@ -0,0 +1,95 @@
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory
+from django.test.utils import override_settings
+
+from chats.middleware import (
+    OffensiveLanguageMiddleware,
+    RequestLoggingMiddleware,
+    RestrictAccessByTimeMiddleware,
+    RolepermissionMiddleware,
+)
+
+MIDDLEWARE_CLASSES = [
+    RolepermissionMiddleware,
+    OffensiveLanguageMiddleware,
+    RestrictAccessByTimeMiddleware,
+    RequestLoggingMiddleware,
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the chats middleware stack under an async handler, "
+        "comparing sync-only middlewares (adapted with thread hops the way "
+        "Django does) against the native async code paths."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20000)
+        parser.add_argument("--concurrency", type=int, default=100)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as log_dir, override_settings(
+            REQUEST_LOGGING={'FILE': os.path.join(log_dir, 'bench.log')},
+        ):
+            for label, native in (("sync stack", False), ("async stack", True)):
+                stack = self.build_stack(native)
+                latencies = asyncio.run(self.load(
+                    stack, options["requests"], options["concurrency"]))
+                self.report(label, latencies)
+            if RequestLoggingMiddleware.listener is not None:
+                RequestLoggingMiddleware.listener.stop()
+
+    def build_stack(self, native):
+        """
+        Chain the middlewares around an async view, mirroring
+        BaseHandler.load_middleware(is_async=True).
+        """
+        handler = BaseHandler()
+
+        async def view(request):
+            return HttpResponse("ok")
+
+        get_response = view
+        for middleware in reversed(MIDDLEWARE_CLASSES):
+            if native:
+                get_response = middleware(get_response)
+            else:
+                inner = handler.adapt_method_mode(
+                    False, get_response, method_is_async=True)
+                get_response = handler.adapt_method_mode(
+                    True, middleware(inner), method_is_async=False)
+        return get_response
+
+    async def load(self, stack, total, concurrency):
+        factory = AsyncRequestFactory()
+        paths = ["/api/v1/messages/", "/api/v1/conversations/1/", "/health/"]
+        latencies = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            request = factory.get(paths[i % len(paths)])
+            request.user = AnonymousUser()
+            async with semaphore:
+                start = time.perf_counter()
+                await stack(request)
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return latencies
+
+    def report(self, label, latencies):
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{label:>12}: p50 {quantiles[49] * 1e3:7.3f} ms, "
+            f"p99 {quantiles[98] * 1e3:7.3f} ms over {len(latencies)} requests"
+        )
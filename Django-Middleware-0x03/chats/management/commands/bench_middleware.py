@@ -0,0 +1,79 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from chats.middleware import (
+    OffensiveLanguageMiddleware,
+    RestrictAccessByTimeMiddleware,
+    RolepermissionMiddleware,
+)
+from chats.routing import DEFAULT_ROUTES
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark per-request overhead of the path-classifying chats "
+        "middlewares with a large number of protected prefixes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefixes", type=int, default=120)
+        parser.add_argument("--requests", type=int, default=100000)
+
+    def handle(self, *args, **options):
+        iterations = options["requests"]
+        protected = DEFAULT_ROUTES['ROLE_PROTECTED'] + [
+            f"/api/v1/resource-{i}/" for i in range(options["prefixes"])
+        ]
+        paths = [
+            "/api/v1/messages/",
+            "/api/v1/conversations/42/",
+            f"/api/v1/resource-{options['prefixes'] - 1}/7/",
+            "/static/app.css",
+        ]
+
+        factory = RequestFactory()
+        requests = []
+        for path in paths:
+            request = factory.get(path)
+            request.user = AnonymousUser()
+            requests.append(request)
+
+        def get_response(request):
+            return HttpResponse()
+
+        with override_settings(CHAT_ROUTES={'ROLE_PROTECTED': protected}):
+            middlewares = [
+                RolepermissionMiddleware(get_response),
+                OffensiveLanguageMiddleware(get_response),
+                RestrictAccessByTimeMiddleware(get_response),
+            ]
+
+        self.stdout.write(f"{len(protected)} protected prefixes, "
+                          f"{iterations} requests per measurement")
+
+        linear = self.measure(
+            requests, iterations,
+            lambda request: any(
+                request.path.startswith(prefix) for prefix in protected))
+        compiled = self.measure(
+            requests, iterations,
+            lambda request: middlewares[0].is_protected_path(request.path))
+        self.stdout.write(f"  linear prefix scan:    {linear:8.3f} us/request")
+        self.stdout.write(f"  compiled matcher:      {compiled:8.3f} us/request")
+
+        for middleware in middlewares:
+            elapsed = self.measure(requests, iterations, middleware)
+            self.stdout.write(
+                f"  {type(middleware).__name__:<32} {elapsed:8.3f} us/request")
+
+    def measure(self, requests, iterations, call):
+        count = len(requests)
+        start = time.perf_counter()
+        for i in range(iterations):
+            call(requests[i % count])
+        return (time.perf_counter() - start) / iterations * 1e6
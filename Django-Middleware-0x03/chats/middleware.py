@@ -1,18 +1,65 @@
+import atexit
 import logging
+import queue
+import time
 from datetime import datetime
 import os
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
 from django.conf import settings
 from django.http import HttpResponseForbidden, HttpResponse
 from django.utils import timezone
-from collections import defaultdict, deque
-import time
+from django.utils.functional import empty
+from django.utils.module_loading import import_string
+from .routing import route_matcher, route_prefixes
+from .request_log import (
+    BatchingQueueListener,
+    BatchingRotatingFileHandler,
+    DeferredQueueHandler,
+    RequestJSONFormatter,
+    RequestTextFormatter,
+)
+
+
+async def aget_user(request):
+    """
+    Return request.user from async code without blocking the event loop.
+
+    An already resolved user is returned as is; otherwise it is loaded
+    through request.auser() when available, or in a worker thread.
+    """
+    user = request.user
+    if getattr(user, '_wrapped', None) is not empty:
+        return user
+    if hasattr(request, 'auser'):
+        return await request.auser()
+
+    def load_user():
+        user._setup()
+        return user
+
+    return await sync_to_async(load_user)()
 
 
 class RequestLoggingMiddleware:
     """
     Middleware that logs user's requests to a file, including timestamp, user, and request path.
+
+    By default records are handed to a queue and written in batches by a
+    background thread, so the request path never blocks on disk I/O. The
+    REQUEST_LOGGING setting selects the mode ('queue' or 'sync'), the
+    line format ('text' or 'json', the latter adding method, status code
+    and duration) and size-based rotation.
     """
 
+    sync_capable = True
+    async_capable = True
+
+    listener = None
+
     def __init__(self, get_response):
         """
         Initialize the middleware.
@@ -21,34 +68,84 @@ class RequestLoggingMiddleware:
             get_response: The next middleware or view in the chain
         """
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
-        log_file = os.path.join(settings.BASE_DIR, 'requests.log')
+        config = getattr(settings, 'REQUEST_LOGGING', {})
+        log_file = config.get(
+            'FILE', os.path.join(settings.BASE_DIR, 'requests.log'))
 
         self.logger = logging.getLogger('request_logger')
         self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
 
         if not self.logger.handlers:
-            file_handler = logging.FileHandler(log_file)
+            file_handler = BatchingRotatingFileHandler(
+                log_file,
+                maxBytes=config.get('MAX_BYTES', 10 * 1024 * 1024),
+                backupCount=config.get('BACKUP_COUNT', 5),
+                delay=True,
+            )
             file_handler.setLevel(logging.INFO)
 
-            formatter = logging.Formatter('%(message)s')
+            if config.get('FORMAT', 'text') == 'json':
+                formatter = RequestJSONFormatter()
+            else:
+                formatter = RequestTextFormatter()
             file_handler.setFormatter(formatter)
 
-            self.logger.addHandler(file_handler)
+            if config.get('MODE', 'queue') == 'queue':
+                log_queue = queue.SimpleQueue()
+                RequestLoggingMiddleware.listener = BatchingQueueListener(
+                    log_queue, file_handler,
+                    batch_size=config.get('BATCH_SIZE', 500))
+                RequestLoggingMiddleware.listener.start()
+                atexit.register(RequestLoggingMiddleware.listener.stop)
+                self.logger.addHandler(DeferredQueueHandler(log_queue))
+            else:
+                self.logger.addHandler(file_handler)
+
+    def log_request(self, request, response, duration, user):
+        """
+        Hand the request record to the configured handler.
+        """
+        self.logger.info("request", extra={
+            "user": user.username if user.is_authenticated else "Anonymous",
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration": duration,
+        })
 
     def __call__(self, request):
         """
         Process the request and log the information.
         """
-        if request.user.is_authenticated:
-            user = request.user.username
-        else:
-            user = "Anonymous"
-
-        log_message = f"{datetime.now()} - User: {user} - Path: {request.path}"
-        self.logger.info(log_message)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return self.get_response(request)
 
+        start = time.perf_counter()
         response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        self.log_request(request, response, duration, request.user)
+
+        return response
+
+    async def __acall__(self, request):
+        """
+        Async version of __call__, used when running under ASGI.
+        """
+        if not self.logger.isEnabledFor(logging.INFO):
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        duration = time.perf_counter() - start
+
+        self.log_request(request, response, duration, await aget_user(request))
 
         return response
 
@@ -58,28 +155,33 @@ class RestrictAccessByTimeMiddleware:
     Middleware that restricts access to the messaging app during certain hours.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         """
         Initialize the middleware.
         """
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
         self.start_hour = 6  # 6 AM
         self.end_hour = 21   # 9 PM (21:00)
 
-    def __call__(self, request):
+        self.chat_paths = route_matcher('TIME_RESTRICTED')
+
+    def restricted_response(self, request):
         """
-        Process the request and check if access is allowed during current time.
+        Return a 403 response if the request falls outside allowed hours.
         """
+        if not self.chat_paths.matches(request.path):
+            return None
+
         current_time = timezone.now()
         current_hour = current_time.hour
 
-        chat_paths = ['/api/v1/', '/admin/', '/conversations', '/messages']
-
-        is_chat_request = any(request.path.startswith(path)
-                              for path in chat_paths if path != '/admin/')
-
-        if is_chat_request and not (self.start_hour <= current_hour < self.end_hour):
+        if not (self.start_hour <= current_hour < self.end_hour):
             forbidden_message = f"""
             <html>
             <head><title>Access Restricted</title></head>
@@ -93,7 +195,28 @@ class RestrictAccessByTimeMiddleware:
             """
             return HttpResponseForbidden(forbidden_message)
 
-        response = self.get_response(request)
+        return None
+
+    def __call__(self, request):
+        """
+        Process the request and check if access is allowed during current time.
+        """
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        response = self.restricted_response(request)
+        if response is None:
+            response = self.get_response(request)
+
+        return response
+
+    async def __acall__(self, request):
+        """
+        Async version of __call__, used when running under ASGI.
+        """
+        response = self.restricted_response(request)
+        if response is None:
+            response = await self.get_response(request)
 
         return response
 
@@ -104,19 +227,34 @@ class OffensiveLanguageMiddleware:
     based on their IP address. Implements rate limiting for POST requests to prevent spam.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         """
         Initialize the middleware.
+
+        The limiter backend is configured through the CHAT_RATE_LIMIT
+        setting; the default shares counts through Django's cache so the
+        limit holds across worker processes.
         """
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+        config = getattr(settings, 'CHAT_RATE_LIMIT', {})
+        self.max_messages_per_minute = config.get('LIMIT', 5)
+        self.time_window = config.get('WINDOW', 60)
+
+        backend = import_string(
+            config.get('BACKEND', 'chats.ratelimit.CacheRateLimiter'))
+        self.limiter = backend(
+            self.max_messages_per_minute,
+            self.time_window,
+            **config.get('OPTIONS', {})
+        )
 
-        self.max_messages_per_minute = 5
-        self.time_window = 60
-
-        self.ip_requests = defaultdict(deque)
-
-        self.last_cleanup = time.time()
-        self.cleanup_interval = 300
+        self.messaging_paths = route_matcher('RATE_LIMITED')
 
     def get_client_ip(self, request):
         """
@@ -130,85 +268,68 @@ class OffensiveLanguageMiddleware:
 
         return ip
 
-    def cleanup_old_requests(self):
+    def is_messaging_post(self, request):
         """
-        Remove old request timestamps that are outside the time window.
+        Check if the request sends a chat message and is rate limited.
         """
-        current_time = time.time()
-        cutoff_time = current_time - self.time_window
-
-        for ip, timestamps in list(self.ip_requests.items()):
-            while timestamps and timestamps[0] < cutoff_time:
-                timestamps.popleft()
-
-            if not timestamps:
-                del self.ip_requests[ip]
+        return (
+            request.method == 'POST' and
+            self.messaging_paths.matches(request.path)
+        )
 
-    def is_rate_limited(self, ip_address):
+    def rate_limited_response(self, client_ip):
         """
-        Check if the IP address has exceeded the rate limit.
+        Build the 429 response returned once a client exceeds the limit.
         """
-        current_time = time.time()
-        cutoff_time = current_time - self.time_window
-
-        timestamps = self.ip_requests[ip_address]
-
-        while timestamps and timestamps[0] < cutoff_time:
-            timestamps.popleft()
-
-        return len(timestamps) >= self.max_messages_per_minute
-
-    def record_request(self, ip_address):
+        rate_limit_message = f"""
+        <html>
+        <head><title>Rate Limit Exceeded</title></head>
+        <body>
+            <h1>429 Too Many Requests</h1>
+            <p>You have exceeded the rate limit for sending messages.</p>
+            <p>Limit: {self.max_messages_per_minute} messages per minute</p>
+            <p>Please wait before sending another message.</p>
+            <p>Your IP: {client_ip}</p>
+            <p>Time: {datetime.now().strftime('%H:%M:%S')}</p>
+        </body>
+        </html>
         """
-        Record a new request for the IP address.
-        """
-        current_time = time.time()
-        self.ip_requests[ip_address].append(current_time)
+        response = HttpResponse(rate_limit_message, status=429)
+        # Suggest retry time
+        response['Retry-After'] = str(self.time_window)
+        return response
 
     def __call__(self, request):
         """
         Process the request and check for rate limiting on POST requests to messaging endpoints.
         """
-        current_time = time.time()
-        if current_time - self.last_cleanup > self.cleanup_interval:
-            self.cleanup_old_requests()
-            self.last_cleanup = current_time
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
 
-        messaging_paths = [
-            '/api/v1/messages/', '/api/v1/conversations/', '/messages/', '/conversations/']
-        is_messaging_post = (
-            request.method == 'POST' and
-            any(request.path.startswith(path) for path in messaging_paths)
-        )
-
-        if is_messaging_post:
+        if self.is_messaging_post(request):
             client_ip = self.get_client_ip(request)
 
-            if self.is_rate_limited(client_ip):
-                rate_limit_message = f"""
-                <html>
-                <head><title>Rate Limit Exceeded</title></head>
-                <body>
-                    <h1>429 Too Many Requests</h1>
-                    <p>You have exceeded the rate limit for sending messages.</p>
-                    <p>Limit: {self.max_messages_per_minute} messages per minute</p>
-                    <p>Please wait before sending another message.</p>
-                    <p>Your IP: {client_ip}</p>
-                    <p>Time: {datetime.now().strftime('%H:%M:%S')}</p>
-                </body>
-                </html>
-                """
-                response = HttpResponse(rate_limit_message, status=429)
-                # Suggest retry time
-                response['Retry-After'] = str(self.time_window)
-                return response
-
-            self.record_request(client_ip)
+            if not self.limiter.hit(client_ip):
+                return self.rate_limited_response(client_ip)
 
         response = self.get_response(request)
 
         return response
 
+    async def __acall__(self, request):
+        """
+        Async version of __call__, used when running under ASGI.
+        """
+        if self.is_messaging_post(request):
+            client_ip = self.get_client_ip(request)
+
+            if not await self.limiter.ahit(client_ip):
+                return self.rate_limited_response(client_ip)
+
+        response = await self.get_response(request)
+
+        return response
+
 
 class RolepermissionMiddleware:
     """
@@ -216,30 +337,31 @@ class RolepermissionMiddleware:
     Only admin and moderator users are allowed to perform certain privileged operations.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         """
         Initialize the middleware.
         """
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
         self.allowed_roles = ['admin', 'moderator']
 
-        self.protected_paths = [
-            '/admin/',
-            '/api/v1/admin/',
-            '/api/v1/users/',
-            '/api/v1/conversations/delete/',
-            '/api/v1/messages/delete/',
-            '/api/v1/moderation/',
-        ]
+        self.protected_paths = route_matcher('ROLE_PROTECTED')
+        self.role_checked_paths = route_matcher('ROLE_CHECKED')
+        self.open_paths = frozenset(route_prefixes('OPEN_TO_ALL'))
+        self.open_path_prefixes = route_matcher('OPEN_TO_ALL')
 
-        self.protected_methods = ['POST', 'PUT', 'PATCH', 'DELETE']
+        self.protected_methods = frozenset(['POST', 'PUT', 'PATCH', 'DELETE'])
 
     def is_protected_path(self, request_path):
         """
         Check if the request path requires privileged access.
         """
-        return any(request_path.startswith(path) for path in self.protected_paths)
+        return self.protected_paths.matches(request_path)
 
     def is_protected_operation(self, request):
         """
@@ -249,15 +371,11 @@ class RolepermissionMiddleware:
             return True
 
         if (request.method in self.protected_methods and
-                request.path.startswith('/api/v1/')):
-            allowed_for_all = [
-                '/api/v1/conversations/',
-                '/api/v1/messages/',
-            ]
-
-            if any(request.path == path or
-                   (request.path.startswith(path) and request.method == 'POST')
-                   for path in allowed_for_all):
+                self.role_checked_paths.matches(request.path)):
+            if request.path in self.open_paths:
+                return False
+            if (request.method == 'POST' and
+                    self.open_path_prefixes.matches(request.path)):
                 return False
 
             return True
@@ -273,38 +391,65 @@ class RolepermissionMiddleware:
 
         return hasattr(user, 'role') and user.role in self.allowed_roles
 
+    def denied_response(self, request, user):
+        """
+        Return a 403 response if the user lacks the role the request needs.
+        """
+        if self.has_required_role(user):
+            return None
+
+        if not user.is_authenticated:
+            reason = "Authentication required"
+            user_info = "Not authenticated"
+        else:
+            reason = "Insufficient privileges"
+            user_role = getattr(user, 'role', 'unknown')
+            user_info = f"User role: {user_role}"
+
+        forbidden_message = f"""
+        <html>
+        <head><title>Access Denied</title></head>
+        <body>
+            <h1>403 Forbidden</h1>
+            <p><strong>Access Denied:</strong> {reason}</p>
+            <p>This operation requires admin or moderator privileges.</p>
+            <p><strong>Required roles:</strong> {', '.join(self.allowed_roles)}</p>
+            <p><strong>Your status:</strong> {user_info}</p>
+            <p><strong>Requested path:</strong> {request.path}</p>
+            <p><strong>Method:</strong> {request.method}</p>
+            <p><strong>Time:</strong> {datetime.now().strftime('%H:%M:%S')}</p>
+        </body>
+        </html>
+        """
+
+        return HttpResponseForbidden(forbidden_message)
+
     def __call__(self, request):
         """
         Process the request and check user role for protected operations.
         """
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         if self.is_protected_operation(request):
-            if not self.has_required_role(request.user):
-                if not request.user.is_authenticated:
-                    reason = "Authentication required"
-                    user_info = "Not authenticated"
-                else:
-                    reason = "Insufficient privileges"
-                    user_role = getattr(request.user, 'role', 'unknown')
-                    user_info = f"User role: {user_role}"
-
-                forbidden_message = f"""
-                <html>
-                <head><title>Access Denied</title></head>
-                <body>
-                    <h1>403 Forbidden</h1>
-                    <p><strong>Access Denied:</strong> {reason}</p>
-                    <p>This operation requires admin or moderator privileges.</p>
-                    <p><strong>Required roles:</strong> {', '.join(self.allowed_roles)}</p>
-                    <p><strong>Your status:</strong> {user_info}</p>
-                    <p><strong>Requested path:</strong> {request.path}</p>
-                    <p><strong>Method:</strong> {request.method}</p>
-                    <p><strong>Time:</strong> {datetime.now().strftime('%H:%M:%S')}</p>
-                </body>
-                </html>
-                """
-
-                return HttpResponseForbidden(forbidden_message)
+            response = self.denied_response(request, request.user)
+            if response is not None:
+                return response
 
         response = self.get_response(request)
 
         return response
+
+    async def __acall__(self, request):
+        """
+        Async version of __call__, used when running under ASGI.
+        """
+        if self.is_protected_operation(request):
+            user = await aget_user(request)
+            response = self.denied_response(request, user)
+            if response is not None:
+                return response
+
+        response = await self.get_response(request)
+
+        return response
@@ -0,0 +1,133 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+
+
+class LocalRateLimiter:
+    """
+    In-process rate limiter using approximate sliding-window counters.
+
+    Each key keeps only the counts of the current and previous fixed
+    windows; the previous count is weighted by how much of it still
+    overlaps the sliding window. Keys are evicted least-recently-used
+    once more than ``max_keys`` are tracked, so memory stays bounded
+    regardless of how many distinct clients are seen.
+    """
+
+    def __init__(self, limit, window, max_keys=10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        """
+        Record a request for the key, returning False if it is over the limit.
+        """
+        if now is None:
+            now = time.time()
+        window_start = now - (now % self.window)
+
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = [window_start, 0, 0]
+                self._counters[key] = counter
+                if len(self._counters) > self.max_keys:
+                    self._counters.popitem(last=False)
+            else:
+                self._counters.move_to_end(key)
+
+            start, previous, current = counter
+            if start != window_start:
+                previous = current if window_start - start == self.window else 0
+                current = 0
+                start = window_start
+
+            overlap = 1 - (now - start) / self.window
+            allowed = previous * overlap + current < self.limit
+            if allowed:
+                current += 1
+            counter[:] = [start, previous, current]
+            return allowed
+
+    async def ahit(self, key, now=None):
+        """
+        Async version of hit(); the counters live in memory so it never blocks.
+        """
+        return self.hit(key, now)
+
+
+class CacheRateLimiter:
+    """
+    Rate limiter shared across worker processes through Django's cache.
+
+    The window is split into ``sub_windows`` fixed buckets. A request
+    atomically increments its bucket and sums the buckets covering the
+    window, so the limit holds for every process using the same cache.
+    """
+
+    def __init__(self, limit, window, sub_windows=6, cache_alias="default",
+                 key_prefix="ratelimit"):
+        self.limit = limit
+        self.window = window
+        self.sub_windows = sub_windows
+        self.bucket_size = window / sub_windows
+        self.timeout = math.ceil(window + self.bucket_size)
+        self.cache = caches[cache_alias]
+        self.key_prefix = key_prefix
+
+    def bucket_key(self, key, bucket):
+        return f"{self.key_prefix}:{key}:{bucket}"
+
+    def bucket_keys(self, key, now):
+        """
+        Return the keys of the buckets covering the window, current last.
+        """
+        bucket = int(now // self.bucket_size)
+        return [
+            self.bucket_key(key, b)
+            for b in range(bucket - self.sub_windows + 1, bucket + 1)
+        ]
+
+    def hit(self, key, now=None):
+        """
+        Record a request for the key, returning False if it is over the limit.
+        """
+        if now is None:
+            now = time.time()
+        keys = self.bucket_keys(key, now)
+        current_key = keys[-1]
+
+        self.cache.add(current_key, 0, self.timeout)
+        try:
+            count = self.cache.incr(current_key)
+        except ValueError:
+            # The bucket expired or was evicted between add and incr.
+            self.cache.set(current_key, 1, self.timeout)
+            count = 1
+
+        total = count + sum(self.cache.get_many(keys[:-1]).values())
+        if total > self.limit:
+            # Rejected requests do not count against the client.
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            return False
+        return True
+
+    async def ahit(self, key, now=None):
+        """
+        Async version of hit().
+
+        Django's cache backends implement their async methods by running the
+        sync ones in a thread, so the whole hit is done in one thread hop
+        rather than one per cache call.
+        """
+        return await sync_to_async(self.hit)(key, now)
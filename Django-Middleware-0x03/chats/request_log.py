@@ -0,0 +1,137 @@
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from datetime import datetime
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves formatting to the background writer.
+
+    The stock QueueHandler formats every record on the calling thread;
+    request records only carry immutable values, so they can be enqueued
+    untouched and formatted off the request path.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class BatchingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotating file handler that writes a batch of records with a single
+    write and flush, rolling the file over by size between batches.
+    Records that fail to format are reported through handleError and
+    left out of the batch.
+    """
+
+    def emit_batch(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        data = "".join(lines)
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            position = self.stream.tell()
+            if self.maxBytes > 0 and position and position + len(data) >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(data)
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[0])
+        finally:
+            self.release()
+
+
+class BatchingQueueListener:
+    """
+    Background thread draining a log queue into a batching handler.
+
+    It blocks until a record arrives, then takes whatever else is already
+    queued (up to ``batch_size``) and hands it to the handler in one go,
+    so bursts of requests cost one disk write instead of one per request.
+    """
+
+    _sentinel = None
+
+    def __init__(self, log_queue, handler, batch_size=500):
+        self.queue = log_queue
+        self.handler = handler
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._monitor, name="request-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.queue.put_nowait(self._sentinel)
+        self._thread.join()
+        self._thread = None
+        self.handler.close()
+
+    def _monitor(self):
+        while True:
+            record = self.queue.get()
+            if record is self._sentinel:
+                return
+            batch = [record]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is self._sentinel:
+                    stop = True
+                    break
+                batch.append(record)
+            try:
+                self.handler.emit_batch(batch)
+            except Exception:
+                # Keep draining the queue whatever one batch does.
+                self.handler.handleError(batch[0])
+            if stop:
+                return
+
+
+class RequestTextFormatter(logging.Formatter):
+    """
+    Formats request records as plain text lines.
+    """
+
+    def format(self, record):
+        return (
+            f"{datetime.fromtimestamp(record.created)} - User: {record.user}"
+            f" - Path: {record.path}"
+        )
+
+
+class RequestJSONFormatter(logging.Formatter):
+    """
+    Formats request records as JSON lines, including status and duration.
+    """
+
+    def format(self, record):
+        return json.dumps({
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+            "user": record.user,
+            "method": record.method,
+            "path": record.path,
+            "status": record.status,
+            "duration_ms": round(record.duration * 1000, 3),
+        })
@@ -0,0 +1,92 @@
+import re
+
+from django.conf import settings
+
+# Path prefixes each middleware applies to, overridable per key through
+# the CHAT_ROUTES setting.
+DEFAULT_ROUTES = {
+    # RestrictAccessByTimeMiddleware: chat endpoints closed outside hours.
+    'TIME_RESTRICTED': ['/api/v1/', '/conversations', '/messages'],
+    # OffensiveLanguageMiddleware: endpoints whose POSTs are rate limited.
+    'RATE_LIMITED': [
+        '/api/v1/messages/',
+        '/api/v1/conversations/',
+        '/messages/',
+        '/conversations/',
+    ],
+    # RolepermissionMiddleware: paths that always need a privileged role.
+    'ROLE_PROTECTED': [
+        '/admin/',
+        '/api/v1/admin/',
+        '/api/v1/users/',
+        '/api/v1/conversations/delete/',
+        '/api/v1/messages/delete/',
+        '/api/v1/moderation/',
+    ],
+    # RolepermissionMiddleware: API paths whose writes need a privileged role.
+    'ROLE_CHECKED': ['/api/v1/'],
+    # RolepermissionMiddleware: exempt from the check above when requested
+    # exactly, or below them with POST.
+    'OPEN_TO_ALL': [
+        '/api/v1/conversations/',
+        '/api/v1/messages/',
+    ],
+}
+
+
+class PrefixMatcher:
+    """
+    Matches request paths against a fixed set of prefixes.
+
+    The prefixes are arranged in a trie which is then compiled into a
+    single regular expression, factoring out shared leading characters
+    (``/api/v1/(?:admin/|users/|...)``). A lookup is one anchored regex
+    match, so its cost grows with the length of the path rather than the
+    number of prefixes.
+    """
+
+    def __init__(self, prefixes):
+        self.prefixes = tuple(prefixes)
+        trie = {}
+        for prefix in self.prefixes:
+            node = trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        self.pattern = re.compile(self._compile(trie)) if trie else None
+
+    @classmethod
+    def _compile(cls, node):
+        if "" in node:
+            # A shorter prefix already matches everything below it.
+            return ""
+        branches = []
+        for char, child in sorted(node.items()):
+            branches.append(re.escape(char) + cls._compile(child))
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    def matches(self, path):
+        """
+        Return True if the path starts with any of the prefixes.
+        """
+        return self.pattern is not None and self.pattern.match(path) is not None
+
+    def __repr__(self):
+        return f"PrefixMatcher({list(self.prefixes)!r})"
+
+
+def route_prefixes(name):
+    """
+    Return the configured prefixes of a route, falling back to the default.
+    """
+    return getattr(settings, 'CHAT_ROUTES', {}).get(name, DEFAULT_ROUTES[name])
+
+
+def route_matcher(name):
+    """
+    Build a PrefixMatcher for a route; meant to be called once per
+    middleware instance.
+    """
+    return PrefixMatcher(route_prefixes(name))
@@ -79,6 +79,31 @@ MIDDLEWARE = [
     "chats.middleware.RequestLoggingMiddleware",  # Request logging middleware
 ]
 
+# Rate limiting for OffensiveLanguageMiddleware. CacheRateLimiter shares
+# counts through the default cache, so point CACHES at a shared backend
+# (e.g. Redis) for the limit to hold across workers; LocalRateLimiter
+# keeps bounded per-process counters instead.
+CHAT_RATE_LIMIT = {
+    'BACKEND': 'chats.ratelimit.CacheRateLimiter',
+    'LIMIT': 5,
+    'WINDOW': 60,
+    'OPTIONS': {'sub_windows': 6},
+}
+
+# Path prefixes the chats middlewares classify requests by; see
+# chats.routing.DEFAULT_ROUTES for the keys and their defaults.
+CHAT_ROUTES = {}
+
+# Request logging for RequestLoggingMiddleware. 'queue' mode writes from a
+# background thread in batches; 'json' lines add method, status and duration.
+REQUEST_LOGGING = {
+    'MODE': 'queue',
+    'FORMAT': 'text',
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+    'BATCH_SIZE': 500,
+}
+
 ROOT_URLCONF = 'messaging_app.urls'
 
 TEMPLATES = [
@@ -0,0 +1,128 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Message, Notification, UnreadCount
+
+VERSION_KEY = "inbox:version:{user_id}"
+INBOX_KEY = "inbox:{user_id}:{version}"
+UNREAD_COUNT_KEY = "inbox:unread_count:{user_id}:{version}"
+
+INBOX_FIELDS = ('id', 'sender__username', 'content', 'timestamp', 'parent_message_id')
+UNREAD_LIMIT = 50
+READ_LIMIT = 20
+
+
+def cache_timeout():
+    return getattr(settings, 'INBOX_CACHE_TIMEOUT', 0)
+
+
+def get_inbox_version(user_id):
+    """
+    Return the current inbox version of a user.
+
+    A missing version is seeded from the clock rather than restarted at 1,
+    so entries cached under versions from before an eviction are never
+    picked up again.
+    """
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_inbox_version(user_id):
+    """
+    Invalidate every cached inbox entry of a user.
+    """
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def get_unread_count(user):
+    """
+    Return the number of unread messages of a user, cached per inbox version
+    when INBOX_CACHE_TIMEOUT is set.
+    """
+    timeout = cache_timeout()
+    if timeout:
+        key = UNREAD_COUNT_KEY.format(
+            user_id=user.pk, version=get_inbox_version(user.pk))
+        count = cache.get(key)
+        if count is not None:
+            return count
+    count = UnreadCount.objects.filter(
+        user_id=user.pk).values_list('count', flat=True).first()
+    if count is None:
+        UnreadCount.reconcile([user.pk])
+        count = UnreadCount.objects.get(user_id=user.pk).count
+    if timeout:
+        cache.set(key, count, timeout)
+    return count
+
+
+def get_inbox(user):
+    """
+    Return the user's inbox as plain data, cached per inbox version when
+    INBOX_CACHE_TIMEOUT is set.
+    """
+    timeout = cache_timeout()
+    if timeout:
+        key = INBOX_KEY.format(user_id=user.pk, version=get_inbox_version(user.pk))
+        inbox = cache.get(key)
+        if inbox is not None:
+            return inbox
+    unread = list(
+        Message.unread.unread_for_user(user)
+        .order_by('-timestamp')
+        .values(*INBOX_FIELDS)[:UNREAD_LIMIT]
+    )
+    read = list(
+        Message.objects.filter(receiver=user, read=True)
+        .order_by('-timestamp')
+        .values(*INBOX_FIELDS)[:READ_LIMIT]
+    )
+    inbox = {
+        "unread_count": get_unread_count(user),
+        "unread": unread,
+        "read": read,
+    }
+    if timeout:
+        cache.set(key, inbox, timeout)
+    return inbox
+
+
+def mark_read(user, until=None, thread=None):
+    """
+    Mark a user's received messages up to ``until`` (default: now) as read,
+    optionally only within one thread, together with their notifications.
+
+    Messages are flipped with one UPDATE instead of per-instance saves, so
+    no per-message signals fire; the unread counter is adjusted and the
+    cached inbox invalidated once. Returns the number of messages marked.
+    """
+    if until is None:
+        until = timezone.now()
+    messages = Message.objects.filter(receiver=user, timestamp__lte=until)
+    if thread is not None:
+        root_id = thread.thread_root_id or thread.pk
+        messages = messages.filter(Q(pk=root_id) | Q(thread_root_id=root_id))
+
+    with transaction.atomic():
+        updated = messages.filter(read=False).update(read=True)
+        Notification.objects.filter(
+            user=user, is_read=False, message__in=messages.values('pk')
+        ).update(is_read=True)
+        if updated:
+            UnreadCount.adjust(user.pk, -updated)
+            transaction.on_commit(lambda: bump_inbox_version(user.pk))
+    return updated
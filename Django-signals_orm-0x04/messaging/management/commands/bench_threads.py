@@ -0,0 +1,88 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from messaging.models import Message
+from messaging.views import build_thread_tree, serialize_message
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark thread reads over materialized paths on a wide thread and "
+        "a deep reply chain. Data is created inside a rolled-back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--replies", type=int, default=10000)
+        parser.add_argument("--depth", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            sender = User.objects.create(username="bench-sender")
+            receiver = User.objects.create(username="bench-receiver")
+
+            wide_root = self.create(sender, receiver, None)
+            nodes = [wide_root]
+            for _ in range(options["replies"]):
+                nodes.append(self.create(sender, receiver, random.choice(nodes)))
+
+            deep_root = self.create(sender, receiver, None)
+            node = deep_root
+            for _ in range(options["depth"]):
+                node = self.create(sender, receiver, node)
+
+            self.stdout.write(
+                f"wide thread: {options['replies']} replies, "
+                f"deep thread: depth {options['depth']}")
+
+            self.measure("wide: full subtree", lambda: list(
+                wide_root.get_subtree().select_related("sender", "receiver")))
+            self.measure("wide: nested tree", lambda: build_thread_tree(
+                wide_root.get_subtree().select_related("sender", "receiver")))
+            self.measure("wide: 2 levels", lambda: list(
+                wide_root.get_subtree(max_depth=2)))
+            middle = nodes[len(nodes) // 2]
+            self.measure("wide: replies below node", lambda: list(
+                middle.get_descendants()))
+
+            self.measure("deep: full subtree", lambda: list(
+                deep_root.get_subtree().select_related("sender", "receiver")))
+            self.measure("deep: nested tree", lambda: build_thread_tree(
+                deep_root.get_subtree().select_related("sender", "receiver")))
+            self.measure("deep: flat serialize", lambda: [
+                serialize_message(m) for m in
+                deep_root.get_subtree().select_related("sender", "receiver")])
+            self.measure("deep: level-by-level walk", lambda: self.walk(deep_root))
+
+            transaction.set_rollback(True)
+
+    def create(self, sender, receiver, parent):
+        message = Message(
+            sender=sender, receiver=receiver, parent_message=parent, content="bench")
+        message.save()
+        return message
+
+    def walk(self, root):
+        """
+        Baseline without paths: one query per tree level.
+        """
+        found = []
+        level = [root.pk]
+        while level:
+            level = list(Message.objects.filter(
+                parent_message_id__in=level).values_list("pk", flat=True))
+            found.extend(level)
+        return found
+
+    def measure(self, label, func):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"  {label:<28} {elapsed * 1e3:9.2f} ms, "
+            f"{len(captured.captured_queries)} queries")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from messaging.models import UserPurge
+from messaging.purge import run_user_purge
+
+
+class Command(BaseCommand):
+    help = "Run or resume pending background deletions of user accounts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        pending = list(UserPurge.objects.values_list("user_id", flat=True))
+        for user_id in pending:
+            self.stdout.write(f"Purging user {user_id}...")
+            run_user_purge(user_id, chunk_size=options["chunk_size"])
+        self.stdout.write(f"{len(pending)} purge(s) completed.")
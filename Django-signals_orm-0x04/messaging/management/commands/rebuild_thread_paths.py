@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from messaging.models import Message, encode_path_segment
+
+
+class Command(BaseCommand):
+    help = "Backfill materialized thread paths and depths, one tree level at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        level = {
+            pk: encode_path_segment(pk)
+            for pk in Message.objects.filter(
+                parent_message__isnull=True).values_list("pk", flat=True)
+        }
+        depth = 0
+        total = 0
+
+        while level:
+            with transaction.atomic():
+                Message.objects.bulk_update(
+                    [Message(pk=pk, path=path, depth=depth) for pk, path in level.items()],
+                    ["path", "depth"],
+                    batch_size=batch_size,
+                )
+            total += len(level)
+
+            parent_ids = list(level)
+            children = {}
+            for start in range(0, len(parent_ids), batch_size):
+                rows = Message.objects.filter(
+                    parent_message_id__in=parent_ids[start:start + batch_size]
+                ).values_list("pk", "parent_message_id")
+                for pk, parent_id in rows:
+                    children[pk] = level[parent_id] + encode_path_segment(pk)
+            level = children
+            depth += 1
+
+        self.stdout.write(f"Rebuilt paths for {total} messages across {depth} levels.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from messaging.models import UnreadCount
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized unread message counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users")
+
+    def handle(self, *args, **options):
+        fixed = UnreadCount.reconcile(options["users"])
+        self.stdout.write(f"{fixed} unread counter(s) corrected.")
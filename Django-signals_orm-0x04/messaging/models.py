@@ -1,7 +1,23 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+# Materialized thread paths are the concatenated, fixed-width base-36
+# ids of a message's ancestors followed by its own, so a subtree is one
+# contiguous range of the path index in tree (pre-)order.
+PATH_SEGMENT_WIDTH = 7
+PATH_UPPER_BOUND = '~'
+PATH_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def encode_path_segment(pk):
+    segment = ''
+    while pk:
+        pk, digit = divmod(pk, 36)
+        segment = PATH_DIGITS[digit] + segment
+    return segment.rjust(PATH_SEGMENT_WIDTH, '0')
+
 
 class UnreadMessagesManager(models.Manager):
     def unread_for_user(self, user):
@@ -46,19 +62,176 @@ class Message(models.Model):
 
     read = models.BooleanField(default=False)
 
+    path = models.TextField(blank=True, default='', editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+
    
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['path'], name='message_path_idx'),
+            # Unread/inbox listings: receiver=..., read=..., ordered by time.
+            models.Index(
+                fields=['receiver', 'read', 'timestamp'], name='message_inbox_idx'),
+            models.Index(
+                fields=['thread_root', 'timestamp'], name='message_thread_idx'),
+        ]
   
 
     def __str__(self):
         return f"{self.sender} to {self.receiver}: {self.content[:50]}..."
     
     
+    # Fields whose loaded values are remembered so edits can be detected
+    # without re-fetching the row.
+    TRACKED_FIELDS = ('content', 'sender_id', 'receiver_id', 'read')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self):
+        # Deferred fields are not in __dict__ and are left out of the snapshot.
+        self._loaded_values = {
+            field: self.__dict__[field]
+            for field in self.TRACKED_FIELDS
+            if field in self.__dict__
+        }
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(
+            using=using, fields=fields, from_queryset=from_queryset)
+        # Only the reloaded fields are fresh; the others may hold unsaved edits.
+        reloaded = self.TRACKED_FIELDS
+        if fields is not None:
+            fields = set(fields)
+            reloaded = [
+                field for field in self.TRACKED_FIELDS
+                if field in fields or field.removesuffix('_id') in fields
+            ]
+        self._loaded_values = {
+            **self.loaded_values,
+            **{field: self.__dict__[field] for field in reloaded if field in self.__dict__},
+        }
+
+    @property
+    def loaded_values(self):
+        """
+        Values of the tracked fields as last loaded from or saved to the database.
+        """
+        return getattr(self, '_loaded_values', {})
+
     def save(self, *args, **kwargs):
-        if self.parent_message and not self.thread_root:
-            self.thread_root = self.parent_message.thread_root or self.parent_message
+        adding = self._state.adding
+        if self.parent_message_id and not self.thread_root_id:
+            self.thread_root_id = (
+                self.parent_message.thread_root_id or self.parent_message_id)
         super().save(*args, **kwargs)
+        self._snapshot_tracked_fields()
+        # A deferred path belongs to a row that already has one.
+        if 'path' in self.__dict__ and not self.path:
+            self.set_path()
+            # Replies saved while this message had no path have none either.
+            if self.path and not adding:
+                self.build_descendant_paths()
+
+    def set_path(self):
+        """
+        Derive path and depth from the parent once the message has an id.
+
+        The path is fixed at creation; messages are not re-parented. Under
+        a parent without a path (rows from before paths were backfilled, or
+        created with bulk_create) it is left empty until the parent gets one.
+        """
+        segment = encode_path_segment(self.pk)
+        if self.parent_message_id:
+            parent = self.parent_message
+            if not parent.path:
+                return
+            self.path = parent.path + segment
+            self.depth = parent.depth + 1
+        else:
+            self.path = segment
+            self.depth = 0
+        Message.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+
+    def build_descendant_paths(self, batch_size=1000):
+        """
+        Derive the paths of every reply below this message, one tree level
+        at a time.
+        """
+        level = {self.pk: self.path}
+        depth = self.depth
+        with transaction.atomic():
+            while level:
+                depth += 1
+                parent_ids = list(level)
+                children = {}
+                for start in range(0, len(parent_ids), batch_size):
+                    rows = Message.objects.filter(
+                        parent_message_id__in=parent_ids[start:start + batch_size]
+                    ).values_list('pk', 'parent_message_id')
+                    for pk, parent_id in rows:
+                        children[pk] = level[parent_id] + encode_path_segment(pk)
+                Message.objects.bulk_update(
+                    [Message(pk=pk, path=path, depth=depth) for pk, path in children.items()],
+                    ['path', 'depth'],
+                    batch_size=batch_size,
+                )
+                level = children
+
+    def has_thread_paths(self):
+        """
+        Whether this thread root and every message of its thread have a
+        path, so get_subtree returns the whole thread.
+
+        Replies created with bulk_create get no path until they are saved.
+        """
+        return bool(self.path) and not Message.objects.filter(
+            thread_root_id=self.pk, path='').exists()
+
+    def get_thread_members(self, include_self=True):
+        """
+        Return the thread rooted at this message by thread_root, in
+        timestamp order, for threads whose paths are not all built.
+        Their depth fields are not set.
+        """
+        queryset = Message.objects.filter(thread_root_id=self.pk)
+        if include_self:
+            queryset = Message.objects.filter(
+                models.Q(pk=self.pk) | models.Q(thread_root_id=self.pk))
+        return queryset.order_by('timestamp', 'pk')
+
+    def get_subtree(self, max_depth=None, include_self=True):
+        """
+        Return the message and its replies at any depth as one range query
+        over the path index, in tree order.
+
+        ``max_depth`` limits how many levels below this message are included.
+
+        A thread root whose path is not built yet falls back to
+        get_thread_members, without depth limits; an empty path would
+        otherwise match every message.
+        """
+        if not self.path:
+            if self.parent_message_id:
+                raise ValueError(
+                    f"Message {self.pk} has no thread path; run rebuild_thread_paths")
+            return self.get_thread_members(include_self=include_self)
+        lower = {'path__gte': self.path} if include_self else {'path__gt': self.path}
+        queryset = Message.objects.filter(
+            path__lt=self.path + PATH_UPPER_BOUND, **lower)
+        if max_depth is not None:
+            queryset = queryset.filter(depth__lte=self.depth + max_depth)
+        return queryset.order_by('path')
+
+    def get_descendants(self, max_depth=None):
+        """
+        Return every reply below this message, in tree order.
+        """
+        return self.get_subtree(max_depth=max_depth, include_self=False)
 
     def is_thread_starter(self):
         return self.parent_message is None
@@ -137,4 +310,78 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
     def __str__(self):
-        return f"Notification for {self.user}"
\ No newline at end of file
+        return f"Notification for {self.user}"
+
+
+class UserPurge(models.Model):
+    """
+    A pending background deletion of a user and all of their data.
+
+    The user id is stored as a plain integer so the record outlives the
+    rows it describes until the purge has finished.
+    """
+    user_id = models.IntegerField(unique=True)
+    requested_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Pending purge of user {self.user_id}"
+
+
+class UnreadCount(models.Model):
+    """
+    Denormalized number of unread messages per user, kept current by the
+    Message signals so unread badges are a primary-key lookup.
+
+    The reconcile_unread_counts management command repairs any drift.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='unread_count'
+    )
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.count} unread"
+
+    @classmethod
+    def adjust(cls, user_id, delta):
+        """
+        Add delta to a user's counter.
+
+        A missing counter is rebuilt from the messages on increments only;
+        decrements can come from a cascade deleting the user itself, where
+        recreating the row would break the deletion.
+        """
+        updated = cls.objects.filter(user_id=user_id).update(count=F('count') + delta)
+        if not updated and delta > 0:
+            cls.reconcile([user_id])
+
+    @classmethod
+    def reconcile(cls, user_ids=None):
+        """
+        Recompute the counters of the given users, or of everyone.
+        """
+        unread = Message.objects.filter(read=False)
+        counters = cls.objects.all()
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            unread = unread.filter(receiver_id__in=user_ids)
+            counters = counters.filter(user_id__in=user_ids)
+
+        actual = dict(
+            unread.order_by().values_list('receiver_id').annotate(n=Count('id')))
+        existing = dict(counters.values_list('user_id', 'count'))
+
+        missing = set(actual if user_ids is None else user_ids) - set(existing)
+        cls.objects.bulk_create([
+            cls(user_id=user_id, count=actual.get(user_id, 0))
+            for user_id in missing
+        ], ignore_conflicts=True)
+        stale = [
+            cls(user_id=user_id, count=actual.get(user_id, 0))
+            for user_id, count in existing.items() if count != actual.get(user_id, 0)
+        ]
+        cls.objects.bulk_update(stale, ['count'], batch_size=1000)
+        return len(stale)
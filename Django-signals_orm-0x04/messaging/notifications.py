@@ -0,0 +1,219 @@
+import logging
+import queue
+import threading
+import weakref
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+
+from .models import Message, Notification
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_TEMPLATES = {
+    'message': "{username} sent you a message: {preview}...",
+    'reply': "{username} replied to your message: {preview}...",
+}
+
+
+class NotificationDispatcher:
+    """
+    Defers new-message notifications until the surrounding transaction commits.
+
+    Messages saved inside a transaction are collected and turned into
+    notifications with a single ``bulk_create`` once it commits, after
+    resolving every sender's username with one query. Outside a
+    transaction each message is dispatched right away. Messages created
+    with ``bulk_create`` are passed to ``add_many``. With
+    ``background`` enabled the batches are written by a worker thread
+    instead of the committing request.
+    """
+
+    def __init__(self, batch_size=500, background=False, using=DEFAULT_DB_ALIAS):
+        self.batch_size = batch_size
+        self.background = background
+        self.using = using
+        self._local = threading.local()
+        self._queue = None
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def add(self, message):
+        """
+        Queue a notification for a newly created message.
+        """
+        self.add_many([message])
+
+    def add_many(self, messages):
+        """
+        Queue notifications for newly created messages.
+
+        ``bulk_create`` sends no ``post_save``, so code creating messages in
+        bulk calls this with the created messages (which must have their
+        primary keys set) to have them notified like single saves.
+        """
+        if not messages:
+            return
+        connection = connections[self.using]
+        if not connection.in_atomic_block:
+            for start in range(0, len(messages), self.batch_size):
+                self.dispatch(messages[start:start + self.batch_size])
+            return
+
+        # Messages are grouped by the savepoint they were created in, each
+        # group held strongly only by its commit hook. Django drops a hook
+        # when its savepoint or transaction rolls back, taking the group
+        # (and, with its last group, the batch) with it, so rolled-back
+        # messages are never notified and the next message after a full
+        # rollback starts a new batch.
+        ref = getattr(self._local, 'batch', None)
+        batch = ref() if ref is not None else None
+        if batch is None:
+            batch = _PendingBatch(self)
+            self._local.batch = weakref.ref(batch)
+        batch.group(tuple(connection.savepoint_ids)).extend(messages)
+
+    def dispatch(self, messages, verify=False):
+        """
+        Write notifications for the messages, in the background if enabled.
+        """
+        if not messages:
+            return
+        if self.background:
+            self._ensure_worker()
+            self._queue.put((messages, verify))
+        else:
+            self.write(messages, verify)
+
+    def write(self, messages, verify=False):
+        """
+        Create the notifications of the messages in bulk.
+
+        With ``verify``, messages that no longer exist (created in a
+        savepoint that was later rolled back) are skipped.
+        """
+        if verify:
+            existing = set(Message.objects.using(self.using).filter(
+                pk__in=[message.pk for message in messages]
+            ).values_list('pk', flat=True))
+            messages = [m for m in messages if m.pk in existing]
+
+        usernames = {}
+        missing = set()
+        for message in messages:
+            if Message.sender.is_cached(message):
+                usernames[message.sender_id] = message.sender.username
+            else:
+                missing.add(message.sender_id)
+        missing.difference_update(usernames)
+        if missing:
+            usernames.update(User.objects.using(self.using).filter(
+                pk__in=missing
+            ).values_list('pk', 'username'))
+
+        notifications = []
+        for message in messages:
+            notification_type = 'reply' if message.parent_message_id else 'message'
+            notifications.append(Notification(
+                user_id=message.receiver_id,
+                message=message,
+                notification_type=notification_type,
+                content=NOTIFICATION_TEMPLATES[notification_type].format(
+                    username=usernames.get(message.sender_id, ''),
+                    preview=message.content[:50],
+                ),
+            ))
+        Notification.objects.using(self.using).bulk_create(
+            notifications, batch_size=self.batch_size)
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None:
+                self._queue = queue.SimpleQueue()
+                self._worker = threading.Thread(
+                    target=self._run_worker,
+                    name='notification-dispatcher',
+                    daemon=True,
+                )
+                self._worker.start()
+
+    def _run_worker(self):
+        while True:
+            messages, verify = self._queue.get()
+            close_old_connections()
+            try:
+                self.write(messages, verify)
+            except Exception:
+                logger.exception("Failed to write %d notifications", len(messages))
+            finally:
+                close_old_connections()
+
+
+class _PendingBatch:
+    """
+    Messages collected during one transaction.
+    """
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.groups = []
+        self.flushed = False
+
+    def group(self, savepoint_ids):
+        """
+        Return the message list of the current savepoint, registering a
+        commit hook for it the first time messages are added there.
+        """
+        # Groups of rolled-back savepoints are gone; forget them.
+        while self.groups and self.groups[-1]() is None:
+            self.groups.pop()
+        current = self.groups[-1]() if self.groups else None
+        if current is None or current.savepoint_ids != savepoint_ids:
+            current = _PendingMessages(self, savepoint_ids)
+            self.groups.append(weakref.ref(current))
+            transaction.on_commit(current.flush, using=self.dispatcher.using)
+        return current.messages
+
+    def flush(self):
+        if self.flushed:
+            return
+        self.flushed = True
+        local = self.dispatcher._local
+        if getattr(local, 'batch', None) is not None and local.batch() is self:
+            local.batch = None
+        messages = []
+        for ref in self.groups:
+            group = ref()
+            if group is not None:
+                messages.extend(group.messages)
+        for start in range(0, len(messages), self.dispatcher.batch_size):
+            self.dispatcher.dispatch(
+                messages[start:start + self.dispatcher.batch_size], verify=True)
+
+
+class _PendingMessages:
+    """
+    Messages added within one savepoint of a pending batch.
+
+    The first of the batch's commit hooks to run flushes the whole batch.
+    """
+
+    def __init__(self, batch, savepoint_ids):
+        self.batch = batch
+        self.savepoint_ids = savepoint_ids
+        self.messages = []
+
+    def flush(self):
+        self.batch.flush()
+
+
+def build_dispatcher():
+    config = getattr(settings, 'NOTIFICATION_DISPATCH', {})
+    return NotificationDispatcher(
+        batch_size=config.get('BATCH_SIZE', 500),
+        background=config.get('BACKGROUND', False),
+    )
+
+
+dispatcher = build_dispatcher()
@@ -0,0 +1,248 @@
+import logging
+import threading
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+
+from .inbox import bump_inbox_version
+from .models import Message, MessageHistory, Notification, UnreadCount, UserPurge
+
+logger = logging.getLogger(__name__)
+
+
+def _slices(ids, size):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+class UserDataPurger:
+    """
+    Deletes everything a user owns with set-based SQL, in bounded chunks.
+
+    Django's deletion collector loads every related row into Python and
+    sends per-row signals; for a heavy user that means minutes inside a
+    single transaction. The purger instead selects the user's messages
+    ``chunk_size`` at a time, expands them to their reply subtrees, and
+    removes them deepest level first, ``chunk_size`` messages per
+    transaction, along with their dependent rows, using plain UPDATE/DELETE
+    statements in dependency order. Replies always go before their parents,
+    so every batch leaves the database consistent and an interrupted purge
+    can simply be run again.
+    """
+
+    def __init__(self, chunk_size=1000, using=DEFAULT_DB_ALIAS):
+        self.chunk_size = chunk_size
+        self.using = using
+        self.connection = connections[using]
+        qn = self.connection.ops.quote_name
+        self.message_table = qn(Message._meta.db_table)
+        self.notification_table = qn(Notification._meta.db_table)
+        self.history_table = qn(MessageHistory._meta.db_table)
+
+    def purge(self, user_id):
+        """
+        Delete the user's messages, notifications and edit history.
+        """
+        while self._purge_message_chunk(user_id):
+            pass
+        while self._purge_notification_chunk(user_id):
+            pass
+        while self._purge_history_chunk(user_id):
+            pass
+
+    def _select_ids(self, cursor, sql, params):
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+    def _execute_in(self, cursor, sql, ids):
+        """
+        Run a statement with an ``IN ({ids})`` clause over ids, chunk by chunk.
+        """
+        for chunk in _slices(ids, self.chunk_size):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(sql.format(ids=placeholders), chunk)
+
+    def _subtree_levels(self, cursor, table, ids):
+        """
+        Return ids and every row reachable from them through
+        parent_message_id, grouped by distance from ids, nearest first.
+        """
+        collected = set(ids)
+        levels = []
+        frontier = list(dict.fromkeys(ids))
+        while frontier:
+            levels.append(frontier)
+            children = []
+            for chunk in _slices(frontier, self.chunk_size):
+                placeholders = ", ".join(["%s"] * len(chunk))
+                children.extend(self._select_ids(
+                    cursor,
+                    f"SELECT id FROM {table} "
+                    f"WHERE parent_message_id IN ({placeholders})",
+                    chunk,
+                ))
+            frontier = list(dict.fromkeys(pk for pk in children if pk not in collected))
+            collected.update(frontier)
+        return levels
+
+    def _with_descendants(self, cursor, table, ids):
+        """
+        Expand ids to include every row reachable through parent_message_id.
+        """
+        levels = self._subtree_levels(cursor, table, ids)
+        return [pk for level in levels for pk in level]
+
+    def _delete_notifications(self, cursor, ids):
+        ids = self._with_descendants(cursor, self.notification_table, ids)
+        # Detach the subtree first so rows can be removed in any order.
+        self._execute_in(
+            cursor,
+            f"UPDATE {self.notification_table} SET parent_message_id = NULL "
+            "WHERE id IN ({ids})",
+            ids,
+        )
+        self._execute_in(
+            cursor, f"DELETE FROM {self.notification_table} WHERE id IN ({{ids}})", ids)
+
+    def _purge_message_chunk(self, user_id):
+        with self.connection.cursor() as cursor:
+            seeds = self._select_ids(
+                cursor,
+                f"SELECT id FROM {self.message_table} "
+                f"WHERE sender_id = %s OR receiver_id = %s "
+                f"LIMIT {int(self.chunk_size)}",
+                [user_id, user_id],
+            )
+            if not seeds:
+                return False
+            # Replies cascade with their parent, so whole subtrees go,
+            # including other users' replies; however large a subtree is,
+            # it is removed deepest level first in chunk_size batches.
+            levels = self._subtree_levels(cursor, self.message_table, seeds)
+
+        for level in reversed(levels):
+            for batch in _slices(level, self.chunk_size):
+                with transaction.atomic(using=self.using):
+                    with self.connection.cursor() as cursor:
+                        self._delete_messages(cursor, batch, user_id)
+        return True
+
+    def _delete_messages(self, cursor, ids, user_id):
+        """
+        Delete messages and the rows depending on them.
+
+        Their replies were deleted by earlier batches; any posted since the
+        subtree was collected are picked up and deleted along with them.
+        """
+        ids = self._with_descendants(cursor, self.message_table, ids)
+
+        notification_ids = []
+        for chunk in _slices(ids, self.chunk_size):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            notification_ids.extend(self._select_ids(
+                cursor,
+                f"SELECT id FROM {self.notification_table} "
+                f"WHERE message_id IN ({placeholders})",
+                chunk,
+            ))
+        self._delete_notifications(cursor, notification_ids)
+
+        self._execute_in(
+            cursor,
+            f"DELETE FROM {self.history_table} WHERE message_id IN ({{ids}})",
+            ids,
+        )
+        # thread_root is SET_NULL for messages outside the subtree.
+        self._execute_in(
+            cursor,
+            f"UPDATE {self.message_table} SET thread_root_id = NULL "
+            "WHERE thread_root_id IN ({ids})",
+            ids,
+        )
+        self._execute_in(
+            cursor,
+            f"UPDATE {self.message_table} SET parent_message_id = NULL "
+            "WHERE id IN ({ids})",
+            ids,
+        )
+        receivers = set()
+        for chunk in _slices(ids, self.chunk_size):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            receivers.update(self._select_ids(
+                cursor,
+                f"SELECT DISTINCT receiver_id FROM {self.message_table} "
+                f"WHERE id IN ({placeholders})",
+                chunk,
+            ))
+        self._execute_in(
+            cursor, f"DELETE FROM {self.message_table} WHERE id IN ({{ids}})", ids)
+        # Raw deletes bypass the signals that keep unread counters and
+        # cached inboxes current.
+        receivers.discard(user_id)
+        if receivers:
+            UnreadCount.reconcile(receivers)
+
+            def bump_inbox_versions():
+                for receiver_id in receivers:
+                    bump_inbox_version(receiver_id)
+
+            transaction.on_commit(bump_inbox_versions, using=self.using)
+
+    def _purge_notification_chunk(self, user_id):
+        with transaction.atomic(using=self.using):
+            with self.connection.cursor() as cursor:
+                ids = self._select_ids(
+                    cursor,
+                    f"SELECT id FROM {self.notification_table} "
+                    f"WHERE user_id = %s LIMIT {int(self.chunk_size)}",
+                    [user_id],
+                )
+                if not ids:
+                    return False
+                self._delete_notifications(cursor, ids)
+        return True
+
+    def _purge_history_chunk(self, user_id):
+        with transaction.atomic(using=self.using):
+            with self.connection.cursor() as cursor:
+                ids = self._select_ids(
+                    cursor,
+                    f"SELECT id FROM {self.history_table} "
+                    f"WHERE edited_by_id = %s LIMIT {int(self.chunk_size)}",
+                    [user_id],
+                )
+                if not ids:
+                    return False
+                self._execute_in(
+                    cursor, f"DELETE FROM {self.history_table} WHERE id IN ({{ids}})", ids)
+        return True
+
+
+def run_user_purge(user_id, chunk_size=1000):
+    """
+    Purge a user's data, then delete the user and its pending job record.
+
+    Safe to call again for a purge that was interrupted part-way.
+    """
+    UserDataPurger(chunk_size=chunk_size).purge(user_id)
+    # Little is left for the deletion collector to walk at this point.
+    User.objects.filter(pk=user_id).delete()
+    UserPurge.objects.filter(user_id=user_id).delete()
+
+
+def start_user_purge(user_id, chunk_size=1000):
+    """
+    Run a user purge in a background thread.
+    """
+    def run():
+        close_old_connections()
+        try:
+            run_user_purge(user_id, chunk_size)
+        except Exception:
+            logger.exception("Purge of user %s failed; it can be resumed", user_id)
+        finally:
+            close_old_connections()
+
+    thread = threading.Thread(target=run, name=f"user-purge-{user_id}", daemon=True)
+    thread.start()
+    return thread
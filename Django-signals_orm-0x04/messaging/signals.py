@@ -1,61 +1,114 @@
 from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
+from django.db import transaction
 from django.contrib.auth.models import User
-from .models import Message, Notification, MessageHistory
+from .models import Message, Notification, MessageHistory, UnreadCount, UserPurge
+from .notifications import dispatcher
+from .inbox import bump_inbox_version
 
 @receiver(post_save, sender=Message)
 def create_notification(sender, instance, created, **kwargs):
     """
     A Signal to trigger a notification when a new message instance is created.
+
+    Notifications are handed to the dispatcher, which writes them in bulk
+    once the surrounding transaction commits. ``bulk_create`` sends no
+    post_save; pass its messages to ``dispatcher.add_many`` instead.
     """
     if created:
-        notification_type = 'reply' if instance.parent_message else 'message'
-        if notification_type == 'reply':
-            content = f"{instance.sender.username} replied to your message: {instance.content[:50]}..."
-        else:
-            content = f"{instance.sender.username} sent you a message: {instance.content[:50]}..."
-
-        Notification.objects.create(
-            user=instance.receiver,
-            message=instance,
-            notification_type=notification_type,
-            content=content
-        )
+        dispatcher.add(instance)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_inbox(sender, instance, **kwargs):
+    """
+    A Signal to refresh the receiver's cached inbox once the change commits.
+    """
+    receiver_id = instance.receiver_id
+    transaction.on_commit(lambda: bump_inbox_version(receiver_id))
+
+
+@receiver(post_save, sender=Message)
+def update_unread_count(sender, instance, created, update_fields=None, **kwargs):
+    """
+    A Signal to keep the receiver's denormalized unread counter current.
+
+    The previous read flag comes from the values the message was loaded
+    with; counters are recomputed when it is not known.
+    """
+    if created:
+        if not instance.read:
+            UnreadCount.adjust(instance.receiver_id, 1)
+        return
+    if update_fields is not None and not {'read', 'receiver'} & set(update_fields):
+        return
+
+    loaded = instance.loaded_values
+    if 'read' not in loaded or 'receiver_id' not in loaded:
+        UnreadCount.reconcile([instance.receiver_id])
+    elif loaded['receiver_id'] != instance.receiver_id:
+        UnreadCount.reconcile([loaded['receiver_id'], instance.receiver_id])
+    elif loaded['read'] != instance.read:
+        UnreadCount.adjust(instance.receiver_id, -1 if instance.read else 1)
+
+
+@receiver(post_delete, sender=Message)
+def decrement_unread_count(sender, instance, **kwargs):
+    """
+    A Signal to drop deleted unread messages from the receiver's counter.
+    """
+    if not instance.read:
+        UnreadCount.adjust(instance.receiver_id, -1)
 
 
 @receiver(pre_save, sender=Message)
-def log_message_edit(sender, instance, **kwargs):
+def log_message_edit(sender, instance, update_fields=None, **kwargs):
     """
     A Signal for logging message edits
+
+    The previous content is taken from the values the instance was loaded
+    with, so the row is only re-fetched when content was deferred. Saves
+    whose update_fields leave out content are skipped entirely.
     """
-    if instance.pk:
-        try:
-            old_message = Message.objects.get(pk=instance.pk)
-            if old_message.content != instance.content:
-                MessageHistory.objects.create(
-                    message=old_message,
-                    edited_by=instance.sender,
-                    old_content=old_message.content
-                )
-                instance.is_edited = True
-
-                if old_message.sender != instance.receiver:
-                    Notification.objects.create(
-                        user=old_message.receiver,
-                        message=instance,
-                        notification_type='edit',
-                        content=f"{instance.sender.username} edited their message"
-                    )
-
-        except Message.DoesNotExist:
-            pass
+    if instance.pk is None:
+        return
+    if update_fields is not None and 'content' not in update_fields:
+        return
+
+    loaded = instance.loaded_values
+    if all(field in loaded for field in Message.TRACKED_FIELDS):
+        old_values = loaded
+    else:
+        old_values = Message.objects.filter(pk=instance.pk).values(
+            *Message.TRACKED_FIELDS).first()
+        if old_values is None:
+            return
+
+    if old_values['content'] != instance.content:
+        MessageHistory.objects.create(
+            message=instance,
+            edited_by_id=instance.sender_id,
+            old_content=old_values['content']
+        )
+        instance.is_edited = True
+
+        if old_values['sender_id'] != instance.receiver_id:
+            Notification.objects.create(
+                user_id=old_values['receiver_id'],
+                message=instance,
+                notification_type='edit',
+                content=f"{instance.sender.username} edited their message"
+            )
 
 @receiver(post_delete, sender=User)
 def cleanup_user_related_data(sender, instance, **kwargs):
     """
     A Signal for deleting user-related data
+
+    Messages, notifications and edit history reference the user with
+    CASCADE and are already gone by the time this runs; only the pending
+    purge record, which is not tied to the user by a foreign key, is left.
+    Heavy users should be removed through messaging.purge instead.
     """
-    Message.objects.filter(sender=instance).delete()
-    Message.objects.filter(receiver=instance).delete()
-    Notification.objects.filter(user=instance).delete()
-    MessageHistory.objects.filter(edited_by=instance).delete()
+    UserPurge.objects.filter(user_id=instance.pk).delete()
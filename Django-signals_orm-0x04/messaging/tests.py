@@ -1,3 +1,324 @@
-from django.test import TestCase
+import json
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from .inbox import get_inbox_version, mark_read
+from .models import Message, MessageHistory, Notification, UnreadCount
+from .notifications import _PendingMessages, dispatcher
+from .purge import UserDataPurger, run_user_purge
+from .views import mark_inbox_read, message_thread
+
+
+class NotificationDispatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+
+    def send(self, content):
+        return Message.objects.create(
+            sender=self.alice, receiver=self.bob, content=content)
+
+    def notified(self):
+        return sorted(Notification.objects.values_list('message__content', flat=True))
+
+    def flush_hooks(self, callbacks):
+        return [
+            callback for callback in callbacks
+            if isinstance(getattr(callback, '__self__', None), _PendingMessages)
+        ]
+
+    def test_messages_of_one_transaction_share_one_batch(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.send('one')
+            self.send('two')
+            self.assertEqual(Notification.objects.count(), 0)
+        self.assertEqual(len(self.flush_hooks(callbacks)), 1)
+        self.assertEqual(self.notified(), ['one', 'two'])
+
+    def test_next_transaction_starts_a_new_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send('one')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.send('two')
+        self.assertEqual(len(self.flush_hooks(callbacks)), 1)
+        self.assertEqual(self.notified(), ['one', 'two'])
+
+    def test_batch_rolled_back_with_its_savepoint_is_replaced(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.send('rolled back')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.send('kept')
+        self.assertEqual(len(self.flush_hooks(callbacks)), 1)
+        self.assertEqual(self.notified(), ['kept'])
+
+    def test_messages_of_a_rolled_back_savepoint_are_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.send('before')
+            try:
+                with transaction.atomic():
+                    self.send('rolled back')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.send('after')
+        self.assertEqual(len(self.flush_hooks(callbacks)), 1)
+        self.assertEqual(self.notified(), ['after', 'before'])
+
+    def test_add_many_notifies_bulk_created_messages(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            messages = Message.objects.bulk_create([
+                Message(sender=self.alice, receiver=self.bob, content=f'bulk {i}')
+                for i in range(3)
+            ])
+            dispatcher.add_many(messages)
+        self.assertEqual(self.notified(), ['bulk 0', 'bulk 1', 'bulk 2'])
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)), {self.bob.pk})
+
+
+class MessageSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+
+    def setUp(self):
+        self.message = Message.objects.create(
+            sender=self.alice, receiver=self.bob, content='hello')
+        self.message = Message.objects.get(pk=self.message.pk)
+
+    def test_refresh_from_db_takes_a_new_snapshot(self):
+        Message.objects.filter(pk=self.message.pk).update(content='changed', read=True)
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.loaded_values['content'], 'changed')
+        self.assertIs(self.message.loaded_values['read'], True)
+
+    def test_refresh_of_some_fields_keeps_the_others(self):
+        Message.objects.filter(pk=self.message.pk).update(content='changed', read=True)
+        self.message.refresh_from_db(fields=['content'])
+        self.assertEqual(self.message.loaded_values['content'], 'changed')
+        self.assertIs(self.message.loaded_values['read'], False)
+
+    def test_loading_a_deferred_field_adds_it_to_the_snapshot(self):
+        message = Message.objects.only('pk').get(pk=self.message.pk)
+        self.assertNotIn('content', message.loaded_values)
+        message.content
+        self.assertEqual(message.loaded_values['content'], 'hello')
+
+    def test_save_after_refresh_logs_no_edit(self):
+        Message.objects.filter(pk=self.message.pk).update(content='changed')
+        self.message.refresh_from_db()
+        self.message.save()
+        self.assertFalse(MessageHistory.objects.exists())
+
+    def test_save_after_refresh_does_not_count_a_read_twice(self):
+        self.assertEqual(UnreadCount.objects.get(user=self.bob).count, 1)
+        mark_read(self.bob)
+        self.message.refresh_from_db()
+        self.message.save()
+        self.assertEqual(UnreadCount.objects.get(user=self.bob).count, 0)
+
+
+class UserPurgeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+        cls.carol = User.objects.create_user('carol')
+
+    def setUp(self):
+        def send(sender, receiver, content, parent=None):
+            return Message.objects.create(
+                sender=sender, receiver=receiver, content=content, parent_message=parent)
+
+        self.root = send(self.alice, self.bob, 'root')
+        self.reply = send(self.bob, self.alice, 'reply', self.root)
+        self.deep = send(self.carol, self.bob, 'deep', self.reply)
+        self.deeper = send(self.carol, self.bob, 'deeper', self.deep)
+        self.to_carol = send(self.bob, self.carol, 'to carol', self.root)
+        self.unrelated = send(self.carol, self.bob, 'unrelated')
+        self.subtree = [self.root, self.reply, self.deep, self.deeper, self.to_carol]
+
+        self.deep.content = 'deep, edited'
+        self.deep.save()
+        self.root.content = 'root, edited'
+        self.root.save()
+
+        parent = Notification.objects.create(
+            user=self.bob, message=self.deep, content='deep')
+        self.chained = Notification.objects.create(
+            user=self.carol, message=self.unrelated, content='chained',
+            parent_message=parent)
+        self.kept = Notification.objects.create(
+            user=self.carol, message=self.unrelated, content='kept')
+
+    def unread_counts(self):
+        return dict(UnreadCount.objects.filter(
+            user__in=[self.bob, self.carol]).values_list('user__username', 'count'))
+
+    def assertConsistent(self):
+        ids = set(Message.objects.values_list('pk', flat=True))
+        parents = set(Message.objects.exclude(
+            parent_message=None).values_list('parent_message_id', flat=True))
+        self.assertLessEqual(parents, ids)
+        actual = {
+            user.username: Message.objects.filter(receiver=user, read=False).count()
+            for user in (self.bob, self.carol)
+        }
+        self.assertEqual(self.unread_counts(), actual)
+
+    def assertPurged(self):
+        self.assertFalse(Message.objects.filter(
+            pk__in=[message.pk for message in self.subtree]).exists())
+        self.assertQuerySetEqual(
+            Message.objects.values_list('content', flat=True), ['unrelated'])
+        self.assertQuerySetEqual(
+            Notification.objects.values_list('content', flat=True), ['kept'])
+        self.assertFalse(MessageHistory.objects.exists())
+        self.assertEqual(self.unread_counts(), {'bob': 1, 'carol': 0})
+        self.assertConsistent()
+
+    def test_purge_removes_whole_subtrees_and_dependent_rows(self):
+        self.assertEqual(self.unread_counts(), {'bob': 4, 'carol': 1})
+        self.assertEqual(MessageHistory.objects.count(), 2)
+
+        UserDataPurger(chunk_size=1).purge(self.alice.pk)
+
+        self.assertPurged()
+
+    def test_purge_bumps_inbox_versions_of_other_receivers(self):
+        versions = {user.pk: get_inbox_version(user.pk) for user in (self.bob, self.carol)}
+        with self.captureOnCommitCallbacks(execute=True):
+            UserDataPurger(chunk_size=1).purge(self.alice.pk)
+        for user_id, version in versions.items():
+            self.assertNotEqual(get_inbox_version(user_id), version)
+
+    def test_interrupted_purge_can_be_resumed(self):
+        delete_messages = UserDataPurger._delete_messages
+        calls = []
+
+        def interrupt(purger, cursor, ids, user_id):
+            calls.append(ids)
+            if len(calls) == 3:
+                raise RuntimeError("interrupted")
+            return delete_messages(purger, cursor, ids, user_id)
+
+        with mock.patch.object(UserDataPurger, '_delete_messages', interrupt):
+            with self.assertRaises(RuntimeError):
+                UserDataPurger(chunk_size=1).purge(self.alice.pk)
+
+        self.assertTrue(Message.objects.filter(pk=self.root.pk).exists())
+        self.assertLess(Message.objects.count(), 6)
+        self.assertConsistent()
+
+        run_user_purge(self.alice.pk, chunk_size=1)
+
+        self.assertPurged()
+        self.assertFalse(User.objects.filter(pk=self.alice.pk).exists())
+
+
+class ThreadPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+
+    def send(self, content, parent=None):
+        return Message.objects.create(
+            sender=self.alice, receiver=self.bob, content=content, parent_message=parent)
+
+    def bulk_send(self, content, parent=None):
+        message, = Message.objects.bulk_create([Message(
+            sender=self.alice, receiver=self.bob, content=content, parent_message=parent,
+            thread_root_id=parent and (parent.thread_root_id or parent.pk))])
+        return message
+
+    def fetch_thread(self, message, **params):
+        request = RequestFactory().get('/', params)
+        return json.loads(message_thread(request, message.pk).content)
+
+    def shape(self, tree):
+        return [(node['content'], node['depth'], self.shape(node['replies'])) for node in tree]
+
+    def test_saving_a_bulk_created_root_builds_its_whole_thread(self):
+        root = self.bulk_send('root')
+        reply = self.send('reply', root)
+        nested = self.send('nested', reply)
+        self.assertEqual(reply.path, '')
+
+        root.save()
+
+        nested.refresh_from_db()
+        self.assertEqual(nested.depth, 2)
+        self.assertTrue(root.has_thread_paths())
+        self.assertEqual(self.shape(self.fetch_thread(root)), [
+            ('root', 0, [('reply', 1, [('nested', 2, [])])]),
+        ])
+
+    def test_thread_without_paths_is_nested_by_parent(self):
+        root = self.bulk_send('root')
+        reply = self.send('reply', root)
+        self.send('nested', reply)
+        self.send('second reply', root)
+
+        self.assertEqual(self.shape(self.fetch_thread(root)), [
+            ('root', 0, [
+                ('reply', 1, [('nested', 2, [])]),
+                ('second reply', 1, []),
+            ]),
+        ])
+        self.assertEqual(self.shape(self.fetch_thread(root, depth=1)), [
+            ('root', 0, [('reply', 1, []), ('second reply', 1, [])]),
+        ])
+
+    def test_bulk_created_reply_under_a_built_thread_is_included(self):
+        root = self.send('root')
+        reply = self.send('reply', root)
+        self.bulk_send('bulk reply', reply)
+
+        self.assertFalse(root.has_thread_paths())
+        self.assertEqual(self.shape(self.fetch_thread(root)), [
+            ('root', 0, [('reply', 1, [('bulk reply', 2, [])])]),
+        ])
+
+
+class MarkInboxReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+
+    def setUp(self):
+        self.message = Message.objects.create(
+            sender=self.alice, receiver=self.bob, content='hello',
+            timestamp=timezone.make_aware(datetime(2024, 1, 1, 12)))
+
+    def post(self, **data):
+        request = RequestFactory().post('/', data)
+        request.user = self.bob
+        return mark_inbox_read(request)
+
+    def test_invalid_parameters_are_rejected(self):
+        for data in ({'until': 'yesterday'}, {'until': '2024-02-30T00:00'}, {'thread': 'abc'}):
+            with self.subTest(data=data):
+                self.assertEqual(self.post(**data).status_code, 400)
+
+    def test_naive_until_is_read_in_the_current_time_zone(self):
+        response = self.post(until='2024-01-01T11:00')
+        self.assertEqual(json.loads(response.content), {'marked': 0})
+        response = self.post(until='2024-01-01T12:00')
+        self.assertEqual(json.loads(response.content), {'marked': 1})
+
+    def test_thread_limits_the_messages_marked(self):
+        response = self.post(thread=str(self.message.pk))
+        self.assertEqual(json.loads(response.content), {'marked': 1})
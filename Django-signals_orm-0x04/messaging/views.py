@@ -1,84 +1,281 @@
+import json
 from django.contrib.auth import logout
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.db import transaction
-from django.views.decorators.cache import cache_page
-from .models import Message
+from django.contrib.auth.decorators import login_required
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
+from django.contrib.auth.models import User
+from .models import Message, UserPurge
+from .purge import start_user_purge
+from .inbox import get_inbox, mark_read
 
 def delete_user(request):
     """
     Delete user account and all its related data
+
+    The account is deactivated and logged out right away; its data is
+    removed in chunks by a background purge, which the purge_users
+    management command resumes if it is interrupted.
     """
     user = request.user
     try:
         with transaction.atomic():
+            User.objects.filter(pk=user.pk).update(is_active=False)
+            UserPurge.objects.get_or_create(user_id=user.pk)
             logout(request)
-            user.delete()
     except Exception as e:
         return JsonResponse({"error": "An error occurred during account deletion."}, status=500)
 
-@cache_page(60)
+    start_user_purge(user.pk)
+    return JsonResponse({"status": "Account deletion scheduled."}, status=202)
+
+@login_required
 def user_inbox(request):
-    unread_message = Message.unread.unread_for_user(request.user).only(
-         'id', 'sender__username', 'content', 'timestamp', 'parent_message'
-    ).select_related('sender', 'parent_message')
-
-    read_messages = Message.objects.filter(
-        receiver=request.user,
-        read=True
-    ).only(
-        'id', 'sender__username', 'content', 'timestamp', 'parent_message'
-    ).select_related(
-        "sender",
-        "receiver",
-        "thread_root"
-    )[:20]
-
-    return read_messages
-   
-def build_thread_tree(queryset):
-    messages_by_id = {msg.id: msg for msg in queryset}
+    """
+    Return the user's unread and recent read messages with the unread count.
+
+    With INBOX_CACHE_TIMEOUT set, the payload is cached per user under a
+    version that every change to one of the user's received messages bumps,
+    so it is served from the cache until it actually changes.
+    """
+    return JsonResponse(get_inbox(request.user))
+
+
+@login_required
+@require_POST
+def mark_inbox_read(request):
+    """
+    Mark the user's received messages as read in bulk.
+
+    ``until`` (an ISO timestamp, default now, in the current time zone
+    when it has no offset) bounds the messages marked and ``thread``
+    limits them to the thread of the given message.
+    """
+    until = None
+    if request.POST.get("until"):
+        try:
+            until = parse_datetime(request.POST["until"])
+        except ValueError:
+            until = None
+        if until is None:
+            return JsonResponse({"error": "Invalid 'until' timestamp."}, status=400)
+        if timezone.is_naive(until):
+            until = timezone.make_aware(until)
+
+    thread = None
+    if request.POST.get("thread"):
+        try:
+            thread_id = int(request.POST["thread"])
+        except ValueError:
+            return JsonResponse({"error": "Invalid 'thread' id."}, status=400)
+        thread = get_object_or_404(
+            Message.objects.only("thread_root_id"), pk=thread_id)
+
+    marked = mark_read(request.user, until=until, thread=thread)
+    return JsonResponse({"marked": marked})
+
+
+# Rows fetched per round trip when streaming a thread.
+STREAM_CHUNK_SIZE = 2000
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def serialize_message(message):
+    return {
+        "id": message.id,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat(),
+        "is_edited": message.is_edited,
+        "parent_message_id": message.parent_message_id,
+        "thread_root_id": message.thread_root_id,
+        "depth": message.depth,
+        "sender": {"id": message.sender.id, "username": message.sender.username},
+        "receiver": {"id": message.receiver.id, "username": message.receiver.username},
+    }
+
+
+def build_thread_tree(messages):
+    """
+    Nest serialized messages under their parents.
+
+    Messages must arrive in path order (parents before their replies, each
+    subtree contiguous), so one pass with an explicit stack of open
+    ancestors is enough and no recursion is involved.
+    """
     tree = []
-    for message in messages_by_id.values():
-        message.replies_list = []
-        if message.parent_message_id in messages_by_id:
-            parent = messages_by_id[message.parent_message_id]
-            parent.replies_list.append(message)
-        elif message.is_thread_starter():
-            tree.append(message)
+    ancestors = []
+    for message in messages:
+        data = serialize_message(message)
+        data["replies"] = []
+        while ancestors and ancestors[-1][0] >= message.depth:
+            ancestors.pop()
+        if ancestors:
+            ancestors[-1][1]["replies"].append(data)
+        else:
+            tree.append(data)
+        ancestors.append((message.depth, data))
     return tree
 
-def serialize_message(message_list):
-    serialized_list = []
-    for message in message_list:
-        data = {
-            "id": message.id,
-            "content": message.content,
-            "timestamp": message.timestamp.isoformat() ,
-            "is_edited": message.is_edited,
-            "parent_message_id": message.parent_message_id,
-            "thread_root_id": message.thread_root_id,
-            "sender": {"id": message.sender.id, "username": message.sender.username},
-            "receiver": {"id": message.receiver.id, "username": message.receiver.username},
-            "replies": serialize_message(message.replies_list) 
-        }
-        serialized_list.append(data)
-    return serialized_list
+
+def thread_in_tree_order(messages, max_depth=None):
+    """
+    Arrange a thread's messages in tree order by parent_message_id, setting
+    each one's depth below the thread root and leaving out those deeper
+    than ``max_depth``.
+
+    For threads whose paths are not all built; the thread is held in
+    memory and walked with an explicit stack.
+    """
+    messages = list(messages)
+    ids = {message.id for message in messages}
+    roots = []
+    replies = {}
+    for message in messages:
+        if message.parent_message_id in ids:
+            replies.setdefault(message.parent_message_id, []).append(message)
+        else:
+            roots.append(message)
+
+    ordered = []
+    pending = [(message, 0) for message in reversed(roots)]
+    while pending:
+        message, depth = pending.pop()
+        if max_depth is not None and depth > max_depth:
+            continue
+        message.depth = depth
+        ordered.append(message)
+        pending.extend(
+            (reply, depth + 1) for reply in reversed(replies.get(message.id, ())))
+    return ordered
+
+
+def buffered(pieces, size=STREAM_BUFFER_SIZE):
+    """
+    Join small string pieces into chunks of roughly ``size`` characters.
+    """
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_thread_ndjson(messages):
+    """
+    Emit one JSON object per line, replies linked through parent_message_id.
+    """
+    for message in messages:
+        yield json.dumps(serialize_message(message)) + "\n"
+
+
+def stream_thread_tree(messages):
+    """
+    Emit the nested thread as JSON text while walking messages in path
+    order, keeping only the chain of currently open ancestors in memory.
+    """
+    yield "["
+    # [depth, has_replies] for every message whose replies list is open.
+    open_messages = []
+    has_roots = False
+    for message in messages:
+        while open_messages and open_messages[-1][0] >= message.depth:
+            open_messages.pop()
+            yield "]}"
+        if open_messages:
+            separator = "," if open_messages[-1][1] else ""
+            open_messages[-1][1] = True
+        else:
+            separator = "," if has_roots else ""
+            has_roots = True
+        data = json.dumps(serialize_message(message))
+        yield separator + data[:-1] + ', "replies": ['
+        open_messages.append([message.depth, False])
+    for _ in open_messages:
+        yield "]}"
+    yield "]"
+
 
 def message_thread(request, root_message_id):
+    """
+    Return the thread a message belongs to, nested by default or as a flat
+    list with parent ids when called with ``?format=flat``. ``?depth=N``
+    limits how many levels below the thread root are returned.
+
+    ``?stream=1`` streams the nested form and ``?format=ndjson`` streams
+    one message per line in timestamp order; both read the thread with a
+    chunked iterator so memory stays bounded for any thread size.
+
+    Threads with messages that have no path yet are read whole and nested
+    by parent_message_id instead.
+    """
+    thread_fields = ("path", "depth", "parent_message_id", "thread_root_id")
+    root_message = get_object_or_404(
+        Message.objects.only(*thread_fields), pk=root_message_id)
+    if root_message.thread_root_id:
+        root_message = Message.objects.only(*thread_fields).get(
+            pk=root_message.thread_root_id)
+
     try:
-        root_message = get_object_or_404(Message, pk=root_message_id)
-    except Message.DoesNotExist:
-        return JsonResponse({"error": "Message not found"}, status=404)
-    
-    thread_queryset = Message.objects.filter(
-        thread_root=root_message.thread_root or root_message
-    ).select_related(
-        "sender", "receiver", "parent_message"
-    ).order_by("timestamp")
-    thread_tree = build_thread_tree(thread_queryset)
-
-    serialized_data = serialize_message(thread_tree)
-
-    return JsonResponse(serialized_data, safe=False)
- 
+        max_depth = int(request.GET["depth"])
+    except (KeyError, ValueError):
+        max_depth = None
+
+    output_format = request.GET.get("format")
+    stream = output_format == "ndjson" or request.GET.get("stream") == "1"
+    flat = output_format == "flat"
+
+    if not root_message.has_thread_paths():
+        messages = thread_in_tree_order(
+            root_message.get_thread_members().select_related("sender", "receiver"),
+            max_depth=max_depth,
+        )
+        if output_format == "ndjson":
+            messages.sort(key=lambda message: (message.timestamp, message.id))
+            return StreamingHttpResponse(
+                buffered(stream_thread_ndjson(messages)),
+                content_type="application/x-ndjson",
+            )
+        if flat:
+            return JsonResponse(
+                [serialize_message(message) for message in messages], safe=False)
+        return HttpResponse(
+            "".join(stream_thread_tree(messages)),
+            content_type="application/json",
+        )
+
+    thread_queryset = root_message.get_subtree(max_depth=max_depth).select_related(
+        "sender", "receiver"
+    )
+
+    if output_format == "ndjson":
+        messages = thread_queryset.order_by("timestamp", "id").iterator(
+            chunk_size=STREAM_CHUNK_SIZE)
+        return StreamingHttpResponse(
+            buffered(stream_thread_ndjson(messages)),
+            content_type="application/x-ndjson",
+        )
+    if stream:
+        messages = thread_queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+        return StreamingHttpResponse(
+            buffered(stream_thread_tree(messages)),
+            content_type="application/json",
+        )
+
+    if flat:
+        serialized_data = [serialize_message(message) for message in thread_queryset]
+        return JsonResponse(serialized_data, safe=False)
+
+    # Written iteratively, so threads of any depth encode without recursion.
+    return HttpResponse(
+        "".join(stream_thread_tree(thread_queryset)),
+        content_type="application/json",
+    )
@@ -77,6 +77,20 @@ CACHES = {
         }
 }
 
+# Seconds a user's inbox and unread count are cached; 0 disables the cache.
+# Changes to the user's received messages invalidate the entry in the
+# cache, so only enable this with a CACHES backend shared by every worker
+# (e.g. Redis); with the default per-process LocMemCache the other workers
+# would serve a stale inbox until expiry.
+INBOX_CACHE_TIMEOUT = 0
+
+# New-message notifications are bulk-created when the surrounding
+# transaction commits; BACKGROUND hands the batches to a worker thread.
+NOTIFICATION_DISPATCH = {
+    'BATCH_SIZE': 500,
+    'BACKGROUND': False,
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,23 +1,83 @@
 from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+USER_CACHE_KEY = "chats:auth_user:{user_id}"
+TOKEN_VERSION_CLAIM = "token_version"
+
+
+def user_cache_key(user_id):
+    return USER_CACHE_KEY.format(user_id=user_id)
+
+
+def invalidate_cached_user(user):
+    """
+    Drop the cached authentication entry of a user.
+    """
+    cache.delete(user_cache_key(getattr(user, api_settings.USER_ID_FIELD)))
+
+
+def build_cached_user(user_model, entry):
+    """
+    Rebuild a user instance from a cached authentication entry.
+
+    Only the primary key, is_active and role are loaded; the remaining
+    fields are deferred and fetched on first access, as with only().
+    """
+    return user_model.from_db(
+        DEFAULT_DB_ALIAS,
+        [user_model._meta.pk.attname, "is_active", "role"],
+        [entry["pk"], entry["is_active"], entry["role"]],
+    )
 
 
 class CustomJWTAuthentication(JWTAuthentication):
     def get_user(self, validated_token):
         """
         Return the user referenced by the validated token
+
+        When ``JWT_USER_CACHE_TIMEOUT`` is set, the fields permissions need
+        are cached per user and token version, so authenticated requests
+        skip the user lookup until the entry expires or the user changes.
+        Changes are only seen by every worker if the cache is shared.
         """
-        user_id = validated_token.get(settings.USER_ID_CLAIM)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
 
         if user_id is None:
             raise AuthenticationFailed(
                 "Token contained no recognizable user identification",
                 code="user_id_missing"
             )
+
+        timeout = getattr(settings, "JWT_USER_CACHE_TIMEOUT", None)
+        if not timeout:
+            return self.get_user_from_db(user_id)
+
+        token_version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+        key = user_cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None or entry["token_version"] != token_version:
+            user = self.get_user_from_db(user_id)
+            cache.set(key, {
+                "token_version": token_version,
+                "pk": user.pk,
+                "is_active": user.is_active,
+                "role": user.role,
+            }, timeout)
+            return user
+
+        if not entry["is_active"]:
+            raise AuthenticationFailed(
+                "User is inactive", code="user_inactive")
+        return build_cached_user(self.user_model, entry)
+
+    def get_user_from_db(self, user_id):
         try:
             user = self.user_model.objects.get(
-                **{settings.USER_ID_FIELD: user_id})
+                **{api_settings.USER_ID_FIELD: user_id})
         except self.user_model.DoesNotExist:
             raise AuthenticationFailed(
                 "User not found", code="user_not_found"
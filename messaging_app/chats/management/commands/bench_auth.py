@@ -0,0 +1,56 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chats.auth import CustomJWTAuthentication, user_cache_key
+from chats.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark CustomJWTAuthentication with and without the user cache, "
+        "reporting queries and latency per authenticated request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        iterations = options["requests"]
+
+        with transaction.atomic():
+            suffix = uuid.uuid4().hex[:8]
+            user = User.objects.create(
+                username=f"bench-{suffix}",
+                email=f"bench-{suffix}@example.com",
+            )
+            token = str(AccessToken.for_user(user))
+            request = RequestFactory().get(
+                "/api/conversations/", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+            for label, timeout in (("uncached", None), ("cached", 300)):
+                with override_settings(JWT_USER_CACHE_TIMEOUT=timeout):
+                    cache.delete(user_cache_key(user.pk))
+                    queries, elapsed = self.run(request, iterations)
+                self.stdout.write(
+                    f"{label:>8}: {queries / iterations:.3f} queries/request, "
+                    f"{elapsed / iterations * 1e6:.1f} us/request"
+                )
+
+            cache.delete(user_cache_key(user.pk))
+            transaction.set_rollback(True)
+
+    def run(self, request, iterations):
+        authenticator = CustomJWTAuthentication()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                authenticator.authenticate(request)
+            elapsed = time.perf_counter() - start
+        return len(captured.captured_queries), elapsed
@@ -0,0 +1,69 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Conversation
+
+CACHE_KEY = "chats:conversation_ids:{user_id}"
+REQUEST_ATTR = "_conversation_ids"
+
+
+def cache_key(user_id):
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def get_conversation_ids(request):
+    """
+    Return the set of conversation IDs (as strings) the requesting user
+    participates in.
+
+    The set is loaded at most once per request, so permission classes and
+    viewsets can check membership without querying the database again.
+    With ``CONVERSATION_MEMBERSHIP_CACHE_TTL`` set it is also shared
+    between requests through the cache, which must then be a backend
+    shared by every worker for invalidation to reach them all.
+    """
+    conversation_ids = getattr(request, REQUEST_ATTR, None)
+    if conversation_ids is not None:
+        return conversation_ids
+
+    user = request.user
+    if not user.is_authenticated:
+        conversation_ids = frozenset()
+    else:
+        ttl = getattr(settings, "CONVERSATION_MEMBERSHIP_CACHE_TTL", 0)
+        key = cache_key(user.pk)
+        cached = cache.get(key) if ttl else None
+        if cached is None:
+            cached = [
+                str(pk) for pk in Conversation.objects.filter(
+                    participants=user
+                ).values_list("pk", flat=True)
+            ]
+            if ttl:
+                cache.set(key, cached, ttl)
+        conversation_ids = frozenset(cached)
+
+    setattr(request, REQUEST_ATTR, conversation_ids)
+    return conversation_ids
+
+
+def is_participant(request, conversation_id):
+    """
+    Check whether the requesting user participates in the conversation.
+    """
+    if conversation_id is None:
+        return False
+    try:
+        conversation_id = str(uuid.UUID(str(conversation_id)))
+    except ValueError:
+        return False
+    return conversation_id in get_conversation_ids(request)
+
+
+def invalidate(user_ids):
+    """
+    Drop the cached membership of the given users.
+    """
+    cache.delete_many([cache_key(user_id) for user_id in user_ids])
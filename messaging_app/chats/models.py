@@ -90,5 +90,14 @@ class Message(models.Model):
 
     sent_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Backs keyset pagination of a conversation's messages.
+            models.Index(
+                fields=["conversation", "-sent_at", "-message_id"],
+                name="message_conv_keyset_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Message from {self.sender} at {str(self.sent_at)}"
@@ -1,5 +1,13 @@
-from rest_framework.pagination import PageNumberPagination
+import uuid
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class MessagePagination(PageNumberPagination):
@@ -20,3 +28,124 @@ class MessagePagination(PageNumberPagination):
                 "results": data,
             }
         )
+
+
+class MessageCursorPagination(BasePagination):
+    """
+    Keyset pagination over messages ordered by (sent_at, message_id),
+    newest first.
+
+    Each page is fetched with a single range query seeking past the
+    position encoded in an opaque cursor, so no COUNT or OFFSET is
+    issued and the cost of a page does not depend on how deep it is.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor[2]
+        if reverse:
+            queryset = queryset.order_by("sent_at", "message_id")
+        else:
+            queryset = queryset.order_by("-sent_at", "-message_id")
+
+        if self.cursor is not None:
+            sent_at, message_id, _ = self.cursor
+            if reverse:
+                seek = Q(sent_at__gt=sent_at) | Q(
+                    sent_at=sent_at, message_id__gt=message_id)
+            else:
+                seek = Q(sent_at__lt=sent_at) | Q(
+                    sent_at=sent_at, message_id__lt=message_id)
+            queryset = queryset.filter(seek)
+
+        # Fetch one extra row to learn whether another page follows.
+        results = list(queryset[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.cursor is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """
+        Return the (sent_at, message_id, reverse) position encoded in
+        the request's cursor, or None when paging from the start.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            sent_at = parse_datetime(tokens["s"][0])
+            message_id = uuid.UUID(tokens["m"][0])
+            reverse = bool(int(tokens.get("r", ["0"])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if sent_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return sent_at, message_id, reverse
+
+    def encode_cursor(self, message, reverse=False):
+        tokens = {
+            "s": message.sent_at.isoformat(),
+            "m": str(message.message_id),
+        }
+        if reverse:
+            tokens["r"] = "1"
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Walked backwards past the first row; restart from the top.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "links": {
+                    "next": self.get_next_link(),
+                    "previous": self.get_previous_link(),
+                },
+                "results": data,
+            }
+        )
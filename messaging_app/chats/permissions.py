@@ -1,5 +1,16 @@
 from rest_framework import permissions
 
+from .membership import is_participant
+
+
+def related_conversation_id(obj):
+    """
+    Return the ID of the conversation an object is, or belongs to.
+    """
+    if hasattr(obj, "participants"):
+        return obj.pk
+    return getattr(obj, "conversation_id", None)
+
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
@@ -13,18 +24,18 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         user = request.user
-        participants = getattr(obj, "participants", None)
-        if getattr(obj, "sender", None) == user:
+        sender_id = getattr(obj, "sender_id", None)
+        if sender_id is not None and sender_id == user.pk:
             return True
-        if participants is not None:
-            return participants.filter(id=user.id).exists()
+        if hasattr(obj, "participants"):
+            return is_participant(request, obj.pk)
 
         return False
 
 
 class IsParticipantOfConversation(permissions.BasePermission):
     """
-    User must be authenticated and a participant 
+    User must be authenticated and a participant
     of the conversation or related conversation object.
     """
 
@@ -32,28 +43,9 @@ class IsParticipantOfConversation(permissions.BasePermission):
         return request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj) -> bool:  # type: ignore
-        user = request.user
-        participants = getattr(obj, "participants", None)
-        conversation = getattr(obj, "conversation", None)
-
-        if request.method in permissions.SAFE_METHODS:
-            if participants:
-                return participants.filter(id=user.id).exists()
-            if conversation:
-                return obj.conversation.participants.filter(id=user.id).exists()
-            return False
-        if request.method == "POST":
-            if conversation:
-                return obj.conversation.participants.filter(id=user.id).exists()
-            if participants:
-                return participants.filter(id=user.id).exists()
-            return False
-        if request.method in ["PUT", "PATCH", "DELETE"]:
-            if conversation:
-                return obj.conversation.participants.filter(id=user.id).exists()
-            if participants:
-                return participants.filter(id=user.id).exists()
-            return False
+        if request.method in permissions.SAFE_METHODS or request.method in [
+                "POST", "PUT", "PATCH", "DELETE"]:
+            return is_participant(request, related_conversation_id(obj))
         return False
 
 
@@ -66,10 +58,10 @@ class IsMessageOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj) -> bool:  # type: ignore
         user = request.user
         if request.method in permissions.SAFE_METHODS:
-            return obj.conversation.participants.filter(id=user.id).exists()
+            return is_participant(request, obj.conversation_id)
 
         if request.method == "POST":
-            return obj.conversation.participants.filter(id=user.id).exists()
+            return is_participant(request, obj.conversation_id)
         if request.method in ["PUT", "PATCH", "DELETE"]:
-            return obj.sender == user
+            return obj.sender_id == user.pk
         return False
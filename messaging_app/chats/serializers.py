@@ -38,16 +38,36 @@ class MessageSerializer(serializers.ModelSerializer):
 
 
 class ConversationSerializer(serializers.ModelSerializer):
+    """
+    Serializes a conversation with its participants and a preview of the
+    latest message.
+
+    The full message list is only included when the serializer context
+    sets ``include_messages``. Querysets annotated with
+    ``last_message_body`` (see ``ConversationViewSet.get_queryset``)
+    supply the preview without a per-conversation query.
+    """
+
     participants = UserSerializer(many=True, read_only=True)
     last_message_preview = serializers.SerializerMethodField()
 
     messages = MessageSerializer(many=True, read_only=True)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get("include_messages", True):
+            self.fields.pop("messages")
+
     def get_last_message_preview(self, obj):
-        last_message = obj.messages.all().first()
+        if hasattr(obj, "last_message_body"):
+            body = obj.last_message_body
+        else:
+            last_message = obj.messages.order_by(
+                "-sent_at", "-message_id").first()
+            body = last_message.message_body if last_message else None
 
-        if last_message:
-            return last_message.message_body[:50] + ('...' if len(last_message.message_body) > 50 else '')
+        if body:
+            return body[:50] + ('...' if len(body) > 50 else '')
         return "No messages yet."
 
     class Meta:
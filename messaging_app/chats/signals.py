@@ -0,0 +1,36 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import membership
+from .auth import invalidate_cached_user
+from .models import Conversation, User
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def invalidate_conversation_membership(sender, instance, action, reverse,
+                                       pk_set, **kwargs):
+    """
+    Invalidate cached conversation membership when participants change.
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if reverse:
+        # user.conversations.add(...) and friends: only that user changed.
+        user_ids = [instance.pk]
+    elif action == "pre_clear":
+        user_ids = list(instance.participants.values_list("pk", flat=True))
+    else:
+        user_ids = list(pk_set or ())
+
+    if user_ids:
+        membership.invalidate(user_ids)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    """
+    Drop the cached authentication entry whenever a user changes.
+    """
+    invalidate_cached_user(instance)
@@ -1,9 +1,12 @@
+from django.db.models import OuterRef, Prefetch, Subquery
 from rest_framework import viewsets, status, filters, permissions
 from rest_framework.response import Response
 from rest_framework.exceptions import NotFound, PermissionDenied
-from .models import Message, Conversation
+from .models import Message, Conversation, User
 from .serializers import MessageSerializer, ConversationSerializer
 from .permissions import IsParticipantOfConversation, IsMessageOwnerOrReadOnly
+from .pagination import MessageCursorPagination
+from .membership import get_conversation_ids, is_participant
 
 
 class MessageViewSet(viewsets.ModelViewSet):
@@ -14,30 +17,30 @@ class MessageViewSet(viewsets.ModelViewSet):
         IsMessageOwnerOrReadOnly
     ]
     queryset = Message.objects.all()
+    pagination_class = MessageCursorPagination
 
     filter_backends = [filters.OrderingFilter]
 
     def get_queryset(self):
         conversation_id = self.kwargs.get("conversation_id")
-        try:
-            conversation = Conversation.objects.get(
-                conversation_id=conversation_id)
-        except Conversation.DoesNotExist:
-            raise NotFound("Conversation not found")
-        if not conversation.participants.filter(pk=self.request.user.pk).exists():
+        if not is_participant(self.request, conversation_id):
+            if not Conversation.objects.filter(
+                    conversation_id=conversation_id).exists():
+                raise NotFound("Conversation not found")
             raise PermissionDenied(
                 "You are not a participant in this conversation",
                 code=status.HTTP_403_FORBIDDEN,
             )
-        queryset = Message.objects.filter(conversation=conversation)
+        queryset = Message.objects.filter(conversation_id=conversation_id)
         queryset = self.filter_queryset(queryset)
 
-        return queryset.select_related("sender", "conversation").order_by("-sent_at")
+        return queryset.select_related("sender").order_by("-sent_at")
 
     def list(self, request, *args, **kwargs):
         messages = self.get_queryset()
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        page = self.paginate_queryset(messages)
+        serializer = MessageSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         serializer = MessageSerializer(data=request.data)
@@ -58,9 +61,52 @@ class ConversationViewSet(viewsets.ModelViewSet):
 
     filter_backends = [filters.OrderingFilter]
 
+    def include_messages(self):
+        """
+        Full message lists are only sent on list when requested with
+        ``?include=messages``; single conversations always carry them.
+        """
+        if self.action != "list":
+            return True
+        include = self.request.query_params.get("include", "")
+        return "messages" in include.split(",")
+
+    def get_queryset(self):
+        last_message = Message.objects.filter(
+            conversation=OuterRef("pk")
+        ).order_by("-sent_at", "-message_id")
+
+        queryset = Conversation.objects.filter(
+            conversation_id__in=get_conversation_ids(self.request)
+        ).annotate(
+            last_message_body=Subquery(
+                last_message.values("message_body")[:1])
+        ).prefetch_related(
+            Prefetch(
+                "participants",
+                queryset=User.objects.only(
+                    "user_id", "email", "first_name", "last_name",
+                    "phone_number", "role"
+                ),
+            )
+        )
+        if self.include_messages():
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "messages",
+                    queryset=Message.objects.select_related(
+                        "sender").order_by("sent_at"),
+                )
+            )
+        return self.filter_queryset(queryset)
+
     def list(self, request, *args, **kwargs):
         conversations = self.get_queryset()
-        serializer = ConversationSerializer(conversations, many=True)
+        serializer = ConversationSerializer(
+            conversations,
+            many=True,
+            context={"include_messages": self.include_messages()},
+        )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
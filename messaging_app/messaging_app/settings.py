@@ -168,7 +168,7 @@ SIMPLE_JWT = {
 
     'AUTH_HEADER_TYPES': ('Bearer',),
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
-    'USER_ID_FIELD': 'id',
+    'USER_ID_FIELD': 'user_id',
     'USER_ID_CLAIM': 'user_id',
     'USER_AUTHENTICATION_RULE': 'rest_framework_simplejwt.authentication.default_user_authentication_rule',
 
@@ -182,3 +182,16 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
+
+# Seconds a user's conversation membership is cached between requests;
+# 0 keeps it per request only. Participant changes invalidate the entry in
+# the cache, so only enable this with a CACHES backend shared by every
+# worker (e.g. Redis), not the default per-process LocMemCache.
+CONVERSATION_MEMBERSHIP_CACHE_TTL = 0
+
+# Seconds CustomJWTAuthentication keeps an authenticated user cached;
+# None or 0 disables the cache. User changes invalidate the entry in the
+# cache, so only enable this with a CACHES backend shared by every worker
+# (e.g. Redis); with the default per-process LocMemCache a deactivated
+# user would keep authenticating on the other workers until expiry.
+JWT_USER_CACHE_TIMEOUT = 0
@@ -1,21 +1,139 @@
-import os
+import re
+import heapq
 import sqlite3
+import logging
 import functools
-from datetime import datetime
+import threading
+from bisect import bisect_left
+from random import random
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the latency histogram buckets.
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Normalize a statement so executions differing only in literals group together."""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("(?+)", sql)
+    return " ".join(sql.split()).rstrip(";").rstrip()
+
+class QueryStats:
+    """Aggregated timings of one statement fingerprint."""
+
+    __slots__ = ("count", "total", "min", "max", "rows", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.rows = 0
+        self.histogram = [0] * len(HISTOGRAM_BOUNDS_MS)
+
+    def add(self, elapsed_ms, rows):
+        self.count += 1
+        self.total += elapsed_ms
+        self.min = min(self.min, elapsed_ms)
+        self.max = max(self.max, elapsed_ms)
+        if rows is not None:
+            self.rows += rows
+        self.histogram[bisect_left(HISTOGRAM_BOUNDS_MS, elapsed_ms)] += 1
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "min_ms": self.min if self.count else 0.0,
+            "max_ms": self.max,
+            "rows": self.rows,
+            "histogram": dict(zip(HISTOGRAM_BOUNDS_MS, self.histogram)),
+        }
+
+class QueryProfiler:
+    """
+    Collects per-fingerprint latency statistics and the slowest executions.
+
+    Only a ``sample_rate`` fraction of calls is timed; with ``enabled``
+    off or a call sampled out, the decorated function runs untouched.
+    """
+
+    def __init__(self, enabled=True, sample_rate=1.0, top_n=10):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+        self._stats = {}
+        # Min-heap of (elapsed_ms, sequence, fingerprint, query, rows).
+        self._slowest = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def record(self, query, elapsed_ms, rows=None):
+        key = fingerprint(query)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats()
+            stats.add(elapsed_ms, rows)
+            self._sequence += 1
+            entry = (elapsed_ms, self._sequence, key, query, rows)
+            if len(self._slowest) < self.top_n:
+                heapq.heappush(self._slowest, entry)
+            elif elapsed_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("query=%r elapsed_ms=%.3f rows=%s", key, elapsed_ms, rows)
+
+    def stats(self):
+        """Aggregated statistics keyed by fingerprint."""
+        with self._lock:
+            return {key: stats.as_dict() for key, stats in self._stats.items()}
+
+    def top_slow(self, n=None):
+        """The slowest recorded executions, slowest first."""
+        with self._lock:
+            slowest = sorted(self._slowest, reverse=True)
+        return [
+            {"fingerprint": key, "query": query, "elapsed_ms": elapsed_ms, "rows": rows}
+            for elapsed_ms, _, key, query, rows in slowest[:n]
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slowest.clear()
+
+profiler = QueryProfiler()
 
 #### decorator to log SQL queries
 
-def log_queries(func):
-    """Decorator to log SQL queries or function execution"""
+def log_queries(func=None, *, profiler=profiler):
+    """Decorator to time SQL queries and record them in a QueryProfiler"""
+    if func is None:
+        return functools.partial(log_queries, profiler=profiler)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        if not profiler.enabled or random() >= profiler.sample_rate:
+            return func(*args, **kwargs)
+
         sql_query = kwargs.get('query') or (args[0] if args else None)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if sql_query:
-            print(f"[{timestamp}] Executing Query: {sql_query}")
-        else:
-            print(f"[{timestamp}] Executing function: {func.__name__}")
-        return func(*args, **kwargs)
+        if not isinstance(sql_query, str):
+            sql_query = func.__name__
+        start = perf_counter()
+        result = func(*args, **kwargs)
+        elapsed_ms = (perf_counter() - start) * 1000
+        rows = len(result) if isinstance(result, (list, tuple)) else None
+        profiler.record(sql_query, elapsed_ms, rows)
+        return result
     return wrapper
 
 @log_queries
@@ -1,33 +1,39 @@
-import sqlite3
+import sys
+import time
 import functools
-from datetime import datetime
+
+import db_pool
 
 def with_db_connection(func):
-    """Decorator that opens and closes a database connection."""
+    """Decorator that passes a pooled database connection to the function."""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] Opening database connection...")
-
-        conn = sqlite3.connect("database.db")
-        try:
-            result = func(conn, *args, **kwargs)
-            print(f"[{timestamp}] Query executed successfully.")
-            return result
-        except Exception as e:
-            print(f"[{timestamp}] Error: {e}")
-            raise
-        finally:
-            conn.close()
-            print(f"[{timestamp}] Database connection closed.")
+        with db_pool.connection("database.db") as conn:
+            return func(conn, *args, **kwargs)
     return wrapper
 
 @with_db_connection 
 def get_user_by_id(conn, user_id): 
-cursor = conn.cursor() 
-cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,)) 
-return cursor.fetchone() 
+    cursor = conn.cursor() 
+    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,)) 
+    return cursor.fetchone() 
+
+def benchmark(lookups=100_000):
+    """Time point lookups through get_user_by_id with and without the pool."""
+    for pooling in (False, True):
+        db_pool.POOLING = pooling
+        start = time.perf_counter()
+        for i in range(lookups):
+            get_user_by_id(user_id=i % 1000 + 1)
+        elapsed = time.perf_counter() - start
+        label = "pooled" if pooling else "connect per call"
+        print(f"{label:>16}: {elapsed:.2f}s ({lookups / elapsed:,.0f} lookups/s)")
+    db_pool.POOLING = True
+
 #### Fetch user by ID with automatic connection handling 
 
 user = get_user_by_id(user_id=1)
 print(user)
+
+if __name__ == "__main__" and "--benchmark" in sys.argv:
+    benchmark()
@@ -1,46 +1,218 @@
-import sqlite3
+import time
+import logging
 import functools
-from datetime import datetime
+import itertools
+import threading
+from contextlib import ContextDecorator, nullcontext
+
+import db_cache
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+DATABASE = "users.db"
+
+# Per thread: the connection of the open transaction or batch, the open
+# batch, and how many transactional calls deep the connection is (0 for a
+# batch with no call running).
+_local = threading.local()
+_savepoint_ids = itertools.count()
+
+def _state():
+    if not hasattr(_local, "depth"):
+        _local.conn = _local.batch = _local.depth = None
+    return _local
 
 def with_db_connection(func):
-    """Decorator that opens and closes a database connection."""
+    """
+    Decorator that passes a pooled database connection to the function,
+    or the connection of the transaction or batch open in this thread.
+    """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] Opening database connection...")
-
-        conn = sqlite3.connect("users.db")
-        try:
-            result = func(conn, *args, **kwargs)
-            return result
-        except Exception as e:
-            print(f"[{timestamp}] Error: {e}")
-            raise
-        finally:
-            conn.close()
-            print(f"[{timestamp}] Database connection closed.")
+        state = _state()
+        conn = state.conn
+        if conn is not None:
+            with _batch_lock(state, conn):
+                return func(conn, *args, **kwargs)
+        with db_pool.connection(DATABASE) as conn:
+            return func(conn, *args, **kwargs)
     return wrapper
 
+def _batch_lock(state, conn):
+    # Held while a call uses a batch's connection, so the batch's deadline
+    # timer only ever commits between calls.
+    if state.batch is not None and state.batch.conn is conn:
+        return state.batch.lock
+    return nullcontext()
+
+def _run_in_savepoint(conn, func, args, kwargs):
+    name = f"transactional_{next(_savepoint_ids)}"
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        result = func(conn, *args, **kwargs)
+    except Exception as e:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        logger.error("Rolled back %s due to error: %s", func.__name__, e)
+        raise
+    conn.execute(f"RELEASE {name}")
+    return result
+
 def transactional(func):
-    """Decorator to commit or roll back database transactions."""
+    """
+    Decorator to commit or roll back database transactions.
+
+    Inside another transactional call or a batch_transaction the call runs
+    in a savepoint instead, so its failure only undoes its own changes.
+    Cached query results on the tables written are invalidated once the
+    transaction commits.
+    """
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        state = _state()
+        if state.conn is conn:
+            with _batch_lock(state, conn):
+                depth = state.depth
+                state.depth = depth + 1
+                try:
+                    result = _run_in_savepoint(conn, func, args, kwargs)
+                finally:
+                    state.depth = depth
+                if depth == 0:
+                    state.batch.call_done()
+                return result
+
+        # A different connection inside a batch gets its own transaction;
+        # the batch's state is restored afterwards.
+        previous = state.conn, state.depth
+        state.conn, state.depth = conn, 1
         try:
-            result = func(conn, *args, **kwargs)
+            with db_cache.track_writes(conn) as written:
+                result = func(conn, *args, **kwargs)
             conn.commit()
-            print(f"[{timestamp}] Transaction committed successfully.")
+            db_cache.default_cache.invalidate_tables(written)
+            logger.info("Transaction committed successfully.")
             return result
         except Exception as e:
             conn.rollback()
-            print(f"[{timestamp}] Transaction rolled back due to error: {e}")
+            logger.error("Transaction rolled back due to error: %s", e)
             raise
+        finally:
+            state.conn, state.depth = previous
     return wrapper
 
-@with_db_connection 
-@transactional 
-def update_user_email(conn, user_id, new_email): 
-    cursor = conn.cursor() 
-    cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id)) 
+class batch_transaction(ContextDecorator):
+    """
+    Group the transactional calls made in this thread into shared commits.
+
+    Calls routed through with_db_connection reuse one connection and each
+    runs in its own savepoint; the batch commits once ``max_size`` calls
+    have completed or ``max_latency`` seconds have passed since the first
+    uncommitted one, and again on exit. The latency deadline is kept by a
+    timer thread even when no further call arrives; it waits for a running
+    call to finish before committing. Calls that failed have already been
+    rolled back, so on exit the work of the successful ones is committed
+    even if an exception is propagating.
+
+    The timer needs a connection usable from another thread, which pooled
+    connections are; with db_pool.POOLING off the deadline is only checked
+    as calls complete.
+    """
+
+    def __init__(self, max_size=500, max_latency=1.0):
+        self.max_size = max_size
+        self.max_latency = max_latency
+        self.conn = None
+        self.lock = threading.RLock()
+        self._timer = None
+
+    def __enter__(self):
+        state = _state()
+        if state.conn is not None:
+            raise RuntimeError("A transaction or batch is already open in this thread")
+        self._connection = db_pool.connection(DATABASE)
+        self.conn = self._connection.__enter__()
+        self._tracking = db_cache.track_writes(self.conn)
+        self._written = self._tracking.__enter__()
+        self._pending = 0
+        self._first_pending = None
+        state.conn, state.batch, state.depth = self.conn, self, 0
+        return self
+
+    def call_done(self):
+        self._pending += 1
+        now = time.monotonic()
+        if self._first_pending is None:
+            self._first_pending = now
+            self._start_timer(now)
+        if (self._pending >= self.max_size
+                or now - self._first_pending >= self.max_latency):
+            self.commit()
+
+    def _start_timer(self, first_pending):
+        self._timer = threading.Timer(
+            self.max_latency, self._commit_overdue, (first_pending,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _commit_overdue(self, first_pending):
+        with self.lock:
+            # Skip if the batch ended or these calls were committed since.
+            if self.conn is None or self._first_pending != first_pending:
+                return
+            try:
+                self.commit()
+            except Exception as e:
+                logger.warning("Batch commit at max_latency failed: %s", e)
+
+    def commit(self):
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self.conn.in_transaction:
+                self.conn.commit()
+            db_cache.default_cache.invalidate_tables(self._written)
+            if self._pending:
+                logger.info("Batch of %d calls committed.", self._pending)
+            self._written.clear()
+            self._pending = 0
+            self._first_pending = None
+
+    def __exit__(self, exc_type, exc, tb):
+        with self.lock:
+            try:
+                self.commit()
+            finally:
+                state = _state()
+                state.conn = state.batch = state.depth = None
+                self._tracking.__exit__(None, None, None)
+                self._connection.__exit__(None, None, None)
+                self.conn = None
+        return False
+
+@with_db_connection
+@transactional
+def update_user_email(conn, user_id, new_email):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+
+@with_db_connection
+@transactional
+def update_many(conn, query, params_seq):
+    """Run one write statement for every parameter set with executemany."""
+    cursor = conn.cursor()
+    cursor.executemany(query, params_seq)
+    return cursor.rowcount
+
+def update_user_emails(emails_by_id):
+    """Update many users' emails with one executemany in a single transaction."""
+    return update_many(
+        "UPDATE users SET email = ? WHERE id = ?",
+        [(email, user_id) for user_id, email in emails_by_id.items()],
+    )
 
 update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
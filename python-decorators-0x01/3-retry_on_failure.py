@@ -1,46 +1,138 @@
 import time
+import random
+import asyncio
+import logging
 import sqlite3
 import functools
-from datetime import datetime
+import threading
+
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+# OperationalError messages for contention that goes away on its own.
+TRANSIENT_ERRORS = (
+    "database is locked",
+    "database table is locked",
+    "database schema is locked",
+    "database is busy",
+)
 
 def with_db_connection(func):
-    """Decorator that opens and closes a database connection."""
+    """Decorator that passes a pooled database connection to the function."""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] Opening database connection...")
-        conn = sqlite3.connect("users.db")
-        try:
-            result = func(conn, *args, **kwargs)
-            return result
-        except Exception as e:
-            print(f"[{timestamp}] Error: {e}")
-            raise
-        finally:
-            conn.close()
-            print(f"[{timestamp}] Database connection closed.")
+        with db_pool.connection("users.db") as conn:
+            return func(conn, *args, **kwargs)
     return wrapper
 
-def retry_on_failure(retries=3, delay=2):
-    """Decorator to retry a function if it raises an exception."""
+def is_transient(error):
+    """Whether an error is worth retrying: lock and busy errors only."""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return any(text in message for text in TRANSIENT_ERRORS)
+
+class RetryBudget:
+    """
+    A per-process allowance of retries shared by every decorated function.
+
+    Each retry spends a token and each successful call earns back
+    ``ratio`` of one, up to ``max_tokens``. While the database keeps
+    failing the budget runs dry and calls fail fast instead of piling
+    more retries onto it, until successes refill it.
+    """
+
+    def __init__(self, max_tokens=10, ratio=0.1):
+        self.max_tokens = max_tokens
+        self.ratio = ratio
+        self._tokens = float(max_tokens)
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+default_budget = RetryBudget()
+
+def backoff_delay(attempt, delay, max_delay):
+    """Exponential backoff with full jitter for the given failed attempt."""
+    return random.uniform(0, min(max_delay, delay * 2 ** (attempt - 1)))
+
+def _should_retry(error, attempt, retries, retry_if, budget, name):
+    if not retry_if(error):
+        logger.warning("Attempt %d of %s failed with a permanent error: %s",
+                       attempt, name, error)
+        return False
+    if attempt >= retries:
+        logger.warning("All %d attempts of %s failed: %s", retries, name, error)
+        return False
+    if budget is not None and not budget.try_spend():
+        logger.warning("Retry budget exhausted; not retrying %s: %s", name, error)
+        return False
+    return True
+
+def retry_on_failure(retries=3, delay=2, max_delay=30, retry_if=is_transient,
+                     budget=default_budget):
+    """
+    Decorator to retry a function if it raises a transient exception.
+
+    ``retries`` is the total number of attempts. The wait before each
+    retry is drawn from [0, min(max_delay, delay * 2**n)) so competing
+    workers spread out instead of retrying in lockstep. Retries are
+    drawn from ``budget``; pass None to retry without one.
+    """
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             attempt = 1
-            while attempt <= retries:
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            while True:
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    if not _should_retry(e, attempt, retries, retry_if, budget, func.__name__):
+                        raise
+                    wait = backoff_delay(attempt, delay, max_delay)
+                    logger.info("Attempt %d of %s failed: %s; retrying in %.2fs",
+                                attempt, func.__name__, e, wait)
+                    time.sleep(wait)
+                    attempt += 1
+                else:
+                    if budget is not None:
+                        budget.record_success()
+                    return result
+        return wrapper
+    return decorator
+
+def async_retry_on_failure(retries=3, delay=2, max_delay=30, retry_if=is_transient,
+                           budget=default_budget):
+    """retry_on_failure for coroutine functions, waiting with asyncio.sleep."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            attempt = 1
+            while True:
                 try:
-                    print(f"[{timestamp}] Attempt {attempt} for {func.__name__}...")
-                    return func(*args, **kwargs)
+                    result = await func(*args, **kwargs)
                 except Exception as e:
-                    print(f"[{timestamp}] Attempt {attempt} failed: {e}")
-                    if attempt == retries:
-                        print(f"[{timestamp}] All {retries} attempts failed.")
+                    if not _should_retry(e, attempt, retries, retry_if, budget, func.__name__):
                         raise
-                    else:
-                        print(f"[{timestamp}] Retrying in {delay} seconds...")
-                        time.sleep(delay)
-                        attempt += 1
+                    wait = backoff_delay(attempt, delay, max_delay)
+                    logger.info("Attempt %d of %s failed: %s; retrying in %.2fs",
+                                attempt, func.__name__, e, wait)
+                    await asyncio.sleep(wait)
+                    attempt += 1
+                else:
+                    if budget is not None:
+                        budget.record_success()
+                    return result
         return wrapper
     return decorator
 
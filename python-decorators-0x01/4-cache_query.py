@@ -1,55 +1,61 @@
-import sqlite3
+import logging
 import functools
-from datetime import datetime
 
+import db_cache
+import db_pool
 
-query_cache = {}
+
+query_cache = db_cache.default_cache
 
 def with_db_connection(func):
-    """Decorator that opens and closes a database connection."""
+    """Decorator that passes a pooled database connection to the function."""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] Opening database connection...")
-        conn = sqlite3.connect("users.db")
-        try:
-            result = func(conn, *args, **kwargs)
-            return result
-        except Exception as e:
-            print(f"[{timestamp}] Error: {e}")
-            raise
-        finally:
-            conn.close()
-            print(f"[{timestamp}] Database connection closed.")
+        with db_pool.connection("users.db") as conn:
+            return func(conn, *args, **kwargs)
     return wrapper
 
-def cache_query(func):
-    """Decorator that caches query results based on the SQL query string."""
+logger = logging.getLogger(__name__)
+
+def cache_query(func=None, *, ttl=None, cache=None):
+    """
+    Decorator that caches query results by normalized SQL and parameters.
+
+    Results are kept in a bounded LRU cache, optionally expire after ttl
+    seconds, and are dropped when a transactional write to one of the
+    tables they read from commits.
+    """
+    if func is None:
+        return functools.partial(cache_query, ttl=ttl, cache=cache)
+    cache = cache or query_cache
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         query = kwargs.get('query') or (args[1] if len(args) > 1 else None)
         if query is None:
             raise ValueError("Query string must be provided as a positional or keyword argument")
+        params = kwargs.get('params', args[2] if len(args) > 2 else ())
 
-        if query in query_cache:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            print(f"[{timestamp}] Using cached result for query: {query}")
-            return query_cache[query]
+        key = db_cache.make_key(query, params)
+        hit, result = cache.get(key)
+        if hit:
+            logger.debug("Using cached result for query: %s", key[0])
+            return result
 
-        # Execute query and cache result
+        tables = db_cache.read_tables(query)
+        generation = cache.generation(tables)
         result = func(*args, **kwargs)
-        query_cache[query] = result
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] Caching result for query: {query}")
+        cache.put(key, result, tables, ttl=ttl, generation=generation)
+        logger.debug("Caching result for query: %s", key[0])
         return result
 
     return wrapper
 
 @with_db_connection
 @cache_query
-def fetch_users_with_cache(conn, query):
+def fetch_users_with_cache(conn, query, params=()):
     cursor = conn.cursor()
-    cursor.execute(query)
+    cursor.execute(query, params)
     return cursor.fetchall()
 
 #### First call will cache the result
@@ -0,0 +1,239 @@
+import re
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Comments, string literals, quoted identifiers, words and single symbols.
+_TOKENS = re.compile(
+    r"""--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|\w+|\S""",
+    re.DOTALL,
+)
+_QUOTED = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`""")
+# Clauses that end a FROM list.
+_FROM_END = frozenset((
+    "WHERE", "GROUP", "HAVING", "WINDOW", "ORDER", "LIMIT",
+    "UNION", "EXCEPT", "INTERSECT", "RETURNING",
+))
+_WRITTEN_TABLE = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)'
+    r'\s+["`\[]?(\w+)',
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(sql):
+    """
+    Collapse whitespace outside quoted literals and identifiers and drop a
+    trailing semicolon.
+    """
+    parts = []
+    position = 0
+    for match in _QUOTED.finditer(sql):
+        parts.append(re.sub(r"\s+", " ", sql[position:match.start()]))
+        parts.append(match.group())
+        position = match.end()
+    parts.append(re.sub(r"\s+", " ", sql[position:]))
+    return "".join(parts).strip().rstrip(";").rstrip()
+
+
+def make_key(sql, params=()):
+    """Build a cache key from the normalized statement and its parameters."""
+    if isinstance(params, dict):
+        params = tuple(sorted(params.items()))
+    else:
+        params = tuple(params or ())
+    return normalize_sql(sql), params
+
+
+def _identifier(token):
+    if token[0] in "\"`[":
+        return token[1:-1]
+    if token[0].isalpha() or token[0] == "_":
+        return token
+    return None
+
+
+def read_tables(sql):
+    """
+    Lower-cased names of the tables a query reads from: every table of a
+    comma-separated FROM list and every joined table, in subqueries too.
+    """
+    tokens = [
+        token for token in _TOKENS.findall(sql)
+        if not token.startswith(("--", "/*", "'"))
+    ]
+    tables = set()
+    depth = 0
+    from_depths = set()
+    expect_table = False
+    for index, token in enumerate(tokens):
+        keyword = token.upper()
+        if token == "(":
+            depth += 1
+            expect_table = False
+        elif token == ")":
+            from_depths.discard(depth)
+            depth -= 1
+            expect_table = False
+        elif keyword in ("FROM", "JOIN"):
+            if keyword == "FROM":
+                from_depths.add(depth)
+            expect_table = True
+        elif token == "," and depth in from_depths:
+            expect_table = True
+        elif keyword in _FROM_END:
+            from_depths.discard(depth)
+            expect_table = False
+        elif expect_table:
+            expect_table = False
+            name = _identifier(token)
+            # schema.table
+            if name and index + 2 < len(tokens) and tokens[index + 1] == ".":
+                name = _identifier(tokens[index + 2])
+            if name:
+                tables.add(name.lower())
+    return frozenset(tables)
+
+
+def written_table(sql):
+    """Lower-cased name of the table a write statement modifies, if any."""
+    match = _WRITTEN_TABLE.match(sql)
+    return match.group(1).lower() if match else None
+
+
+def estimate_size(value):
+    """Approximate memory held by a query result (rows of scalars)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        for row in value:
+            size += sys.getsizeof(row)
+            if isinstance(row, (list, tuple)):
+                size += sum(sys.getsizeof(field) for field in row)
+    return size
+
+
+class QueryCache:
+    """
+    A thread-safe LRU cache of query results bounded by entry count and
+    approximate size, with optional expiry and per-table invalidation.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._table_keys = {}
+        # Bumped on every invalidation so a result computed while one of
+        # its tables was being written is not stored.
+        self._generations = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("hits", "misses", "evictions", "expirations", "invalidations"), 0)
+
+    def generation(self, tables):
+        with self._lock:
+            return tuple(self._generations.get(table, 0) for table in tables)
+
+    def get(self, key):
+        """Return (True, value) on a hit and (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+            value, _, expires, _ = entry
+            if expires is not None and expires <= time.monotonic():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return True, value
+
+    def put(self, key, value, tables=frozenset(), ttl=None, generation=None):
+        """
+        Store a result. With generation (from generation(tables) taken before
+        the query ran), the result is dropped if its tables changed since.
+        """
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if generation is not None and generation != tuple(
+                    self._generations.get(table, 0) for table in tables):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires, tables)
+            self._bytes += size
+            for table in tables:
+                self._table_keys.setdefault(table, set()).add(key)
+            while (len(self._entries) > self.max_entries
+                   or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def _remove(self, key):
+        _, size, _, tables = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._table_keys.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._table_keys[table]
+
+    def invalidate_tables(self, tables):
+        """Drop every cached result that reads from one of tables."""
+        with self._lock:
+            for table in tables:
+                table = table.lower()
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in list(self._table_keys.get(table, ())):
+                    self._remove(key)
+                    self._stats["invalidations"] += 1
+        if tables:
+            logger.debug("Invalidated cached queries on %s", ", ".join(sorted(tables)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._table_keys.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._bytes}
+
+
+default_cache = QueryCache()
+
+
+@contextmanager
+def track_writes(conn):
+    """
+    Collect the tables written through conn while the block runs, using
+    SQLite's statement trace callback.
+    """
+    tables = set()
+
+    def trace(statement):
+        table = written_table(statement)
+        if table:
+            tables.add(table)
+
+    conn.set_trace_callback(trace)
+    try:
+        yield tables
+    finally:
+        conn.set_trace_callback(None)
@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Applied to every new connection; journal_mode is persistent in the
+# database file and is only set by the first connection of a pool.
+DEFAULT_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+}
+
+# Set to False to open and close a connection per call instead.
+POOLING = True
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no connection becomes free within the pool timeout."""
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of SQLite connections to one database."""
+
+    def __init__(self, database, max_size=8, timeout=30.0, wal=True, pragmas=None):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.wal = wal
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self._idle = deque()
+        self._size = 0
+        self._wal_set = False
+        self._available = threading.Condition()
+
+    def _connect(self):
+        # Connections move between threads through the pool, but are only
+        # ever used by one thread at a time.
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+        if self.wal and not self._wal_set:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._wal_set = True
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        logger.debug("Opened connection %d to %s", self._size, self.database)
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """Check out a working connection, waiting if the pool is exhausted."""
+        while True:
+            with self._available:
+                if not self._idle and self._size >= self.max_size:
+                    if not self._available.wait_for(
+                            lambda: self._idle or self._size < self.max_size,
+                            timeout=self.timeout):
+                        raise PoolTimeout(
+                            f"No connection to {self.database} free after {self.timeout}s")
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    self._size += 1
+                    conn = None
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except BaseException:
+                    self._discard()
+                    raise
+            if self._is_healthy(conn):
+                return conn
+            logger.warning("Discarding broken connection to %s", self.database)
+            self._discard(conn)
+
+    def release(self, conn):
+        """Return a connection, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    def _discard(self, conn=None):
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        with self._available:
+            self._size -= 1
+            self._available.notify()
+
+    def close(self):
+        """Close the idle connections; checked-out ones close on release."""
+        with self._available:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._discard(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database, **options):
+    """Return the shared pool of a database path, creating it on first use."""
+    key = database if database == ":memory:" else os.path.abspath(database)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(database, **options)
+    return pool
+
+
+@contextmanager
+def connection(database):
+    """
+    Yield a connection to database, from its pool unless POOLING is off.
+
+    Errors are logged before being re-raised.
+    """
+    pool = get_pool(database) if POOLING else None
+    conn = pool.acquire() if pool else sqlite3.connect(database)
+    try:
+        yield conn
+    except Exception as e:
+        logger.error("Error: %s", e)
+        raise
+    finally:
+        if pool:
+            pool.release(conn)
+        else:
+            conn.close()
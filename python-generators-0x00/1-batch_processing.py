@@ -1,36 +1,105 @@
 import mysql.connector
 import sys
+from array import array
+from itertools import compress
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 DB_CONFIG = {
     'host': 'localhost',
-    'user': 'root', 
-    'password': 'password', 
-    'database': 'ALX_prodev', 
+    'user': 'root',
+    'password': 'password',
+    'database': 'ALX_prodev',
+}
+TABLE_NAME = 'user_data'
+COLUMNS = ('user_id', 'name', 'email', 'age')
+NUMERIC_COLUMNS = ('age',)
+
+OPERATORS = {
+    '=': '=',
+    '!=': '<>',
+    '<': '<',
+    '<=': '<=',
+    '>': '>',
+    '>=': '>=',
+    'in': 'IN',
 }
 
 
-def stream_users_in_batches(batch_size: int):
+def build_query(columns=COLUMNS, filters=(), select_exprs=None):
     """
-    Generator function that fetches rows from the user_data table 
+    Builds the SELECT for a projection and (column, operator, value)
+    filters, returning the SQL and its bind parameters.
+
+    Column names and operators are checked against COLUMNS and OPERATORS
+    since identifiers cannot be bound; values always are.
+    """
+    for column in columns:
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+    select_exprs = select_exprs or {}
+    select = ", ".join(select_exprs.get(column, column) for column in columns)
+
+    conditions = []
+    params = []
+    for column, operator, value in filters:
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        if operator not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {operator}")
+        if operator == 'in':
+            values = list(value)
+            if not values:
+                # Nothing can match an empty IN list.
+                conditions.append("1 = 0")
+                continue
+            conditions.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+            params.extend(values)
+        else:
+            conditions.append(f"{column} {OPERATORS[operator]} %s")
+            params.append(value)
+
+    query = f"SELECT {select} FROM {TABLE_NAME}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query, params
+
+
+def stream_users_in_batches(batch_size: int, columns=COLUMNS, filters=()):
+    """
+    Generator function that fetches rows from the user_data table
     in batches using the specified batch size.
+
+    Only the projected columns of rows matching the filters are read, and
+    the cursor is unbuffered so rows are pulled from the server batch by
+    batch instead of all at once.
     """
-    connection = mysql.connector.connect(**DB_CONFIG)
+    query, params = build_query(columns, filters)
+    yield from _fetch_batches(query, params, batch_size, dictionary=True)
+
+
+def _fetch_batches(query, params, batch_size, dictionary=False):
+    # consume_results lets the connection close cleanly when the caller
+    # stops before the last batch.
+    connection = mysql.connector.connect(**DB_CONFIG, consume_results=True)
     if not connection:
-        return 
+        return
+
+    cursor = connection.cursor(dictionary=dictionary, buffered=False)
 
-    cursor = connection.cursor(dictionary=True, buffered=True)
-    
     try:
-        query = f"SELECT user_id, name, email, age FROM user_data"
-        cursor.execute(query)
-        
+        cursor.execute(query, params)
+
         while True:
             batch = cursor.fetchmany(batch_size)
             if not batch:
-                break 
+                break
             yield batch
-            
+
     except mysql.connector.Error as err:
         print(f"Error during batch data streaming: {err}", file=sys.stderr)
     finally:
@@ -38,12 +107,50 @@ def stream_users_in_batches(batch_size: int):
         connection.close()
 
 
+def stream_column_batches(batch_size: int, columns=COLUMNS, filters=()):
+    """
+    Streams filtered, projected batches as dicts of column -> values.
+
+    Numeric columns arrive as float arrays (NumPy arrays when NumPy is
+    installed, array('d') otherwise) and the rest as lists, or NumPy
+    object arrays, so a batch can be filtered with one comparison per
+    column, e.g. ``select_rows(batch, batch['age'] > 30)`` under NumPy.
+    """
+    select_exprs = {column: f"{column} + 0E0" for column in NUMERIC_COLUMNS}
+    query, params = build_query(columns, filters, select_exprs)
+    for rows in _fetch_batches(query, params, batch_size):
+        batch = {}
+        for column, values in zip(columns, zip(*rows)):
+            if column in NUMERIC_COLUMNS:
+                values = array('d', values)
+                batch[column] = np.frombuffer(values) if np is not None else values
+            else:
+                batch[column] = np.array(values, dtype=object) if np is not None else list(values)
+        yield batch
+
+
+def select_rows(batch, mask):
+    """
+    Keeps the rows of a columnar batch where mask is true.
+    """
+    if np is not None:
+        mask = np.asarray(mask, dtype=bool)
+        return {column: values[mask] for column, values in batch.items()}
+    mask = list(mask)
+    return {
+        column: (array('d', compress(values, mask)) if isinstance(values, array)
+                 else list(compress(values, mask)))
+        for column, values in batch.items()
+    }
+
+
 def batch_processing(batch_size: int):
     """
-    Processes each batch of user data to filter users over the age of 25 
+    Processes each batch of user data to filter users over the age of 25
     and prints the results.
+
+    The age filter runs in the database, so only matching rows are sent.
     """
-    for batch in stream_users_in_batches(batch_size):
+    for batch in stream_users_in_batches(batch_size, filters=[('age', '>', 25)]):
         for user in batch:
-            if float(user['age']) > 25:
-                print(user)
+            print(user)
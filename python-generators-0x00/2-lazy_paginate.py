@@ -1,23 +1,128 @@
 #!/usr/bin/python3
+import queue
+import threading
+
+from mysql.connector import pooling
+
 seed = __import__('seed')
 
+POOL_SIZE = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> pooling.MySQLConnectionPool:
+    """Returns the shared connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name='lazy_paginate',
+                pool_size=POOL_SIZE,
+                **seed.DB_CONFIG,
+                database=seed.DB_NAME,
+            )
+    return _pool
+
 
 def paginate_users(page_size, offset):
     connection = seed.connect_to_prodev()
     cursor = connection.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
+    cursor.execute("SELECT * FROM user_data LIMIT %s OFFSET %s", (page_size, offset))
     rows = cursor.fetchall()
     connection.close()
     return rows
 
 
-def lazy_paginate(page_size: int):
-    offset = 0
-    while True:
-        page = paginate_users(page_size, offset)
-        if not page:
-            break
+def fetch_page_after(cursor, page_size: int, last_user_id=None) -> list:
+    """Fetches the page of users that follows last_user_id in user_id order.
+
+    Seeking on the primary key costs the same for every page, unlike
+    OFFSET, which reads and discards all the rows before the page.
+    """
+    if last_user_id is None:
+        cursor.execute(
+            "SELECT * FROM user_data ORDER BY user_id LIMIT %s", (page_size,))
+    else:
+        cursor.execute(
+            "SELECT * FROM user_data WHERE user_id > %s ORDER BY user_id LIMIT %s",
+            (last_user_id, page_size),
+        )
+    return cursor.fetchall()
 
+
+def _iter_pages(cursor, page_size: int, stop: threading.Event = None):
+    last_user_id = None
+    while stop is None or not stop.is_set():
+        page = fetch_page_after(cursor, page_size, last_user_id)
+        if not page:
+            return
         yield page
+        if len(page) < page_size:
+            return
+        last_user_id = page[-1]['user_id']
 
-        offset += page_size
+
+def _prefetch_pages(cursor, page_size: int, pages: queue.Queue, stop: threading.Event):
+    """Fills pages one step ahead of the consumer; None marks the end."""
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        for page in _iter_pages(cursor, page_size, stop):
+            if not put(page):
+                return
+    except Exception as err:
+        put(err)
+        return
+    put(None)
+
+
+def keyset_paginate(page_size: int, prefetch: bool = False):
+    """Yields pages of users in user_id order over one pooled connection.
+
+    With prefetch, the next page is fetched by a background thread while
+    the caller processes the current one.
+    """
+    connection = get_pool().get_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        if not prefetch:
+            yield from _iter_pages(cursor, page_size)
+            return
+
+        pages = queue.Queue(maxsize=1)
+        stop = threading.Event()
+        worker = threading.Thread(
+            target=_prefetch_pages,
+            args=(cursor, page_size, pages, stop),
+            name='lazy-paginate-prefetch',
+            daemon=True,
+        )
+        worker.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is None:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            stop.set()
+            worker.join()
+    finally:
+        cursor.close()
+        # Returns the connection to the pool.
+        connection.close()
+
+
+def lazy_paginate(page_size: int):
+    yield from keyset_paginate(page_size)
@@ -1,21 +1,35 @@
 #!/usr/bin/python3
+import time
+from array import array
+
 seed = __import__('seed')
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BATCH_SIZE = 10000
+
+# Adding a DOUBLE zero makes the server send ages as floats, sparing the
+# client a Decimal object per row.
+AGE_AS_DOUBLE = "age + 0E0"
+
 
 def stream_user_ages():
-    connection = seed.connect_to_prodev() 
+    connection = seed.connect_to_prodev()
     if not connection:
-        return 
+        return
 
     cursor = connection.cursor(dictionary=True, buffered=False)
-    
+
     try:
         query = "SELECT age FROM user_data"
         cursor.execute(query)
-        
+
         for row in cursor:
             yield float(row['age'])
-            
+
     except Exception as err:
         print(f"Error during data streaming: {err}")
     finally:
@@ -23,16 +37,141 @@ def stream_user_ages():
         connection.close()
 
 
+def stream_age_batches(batch_size: int = BATCH_SIZE):
+    """
+    Streams the ages in batches fetched with fetchmany, each batch a
+    NumPy float64 array when NumPy is installed and an array('d') otherwise.
+    """
+    connection = seed.connect_to_prodev()
+    if not connection:
+        return
+
+    cursor = connection.cursor(buffered=False)
+    try:
+        cursor.execute(f"SELECT {AGE_AS_DOUBLE} FROM user_data")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = array('d', [row[0] for row in rows])
+            yield np.frombuffer(batch) if np is not None else batch
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def aggregate_ages(bin_width: float = None) -> dict:
+    """
+    Computes count, mean, min and max of the ages in SQL, plus a histogram
+    of bin_width-wide buckets when one is given, so only the results
+    cross the wire. Without a connection every statistic is None.
+    """
+    connection = seed.connect_to_prodev()
+    if not connection:
+        stats = {'count': None, 'mean': None, 'min': None, 'max': None}
+        if bin_width:
+            stats['histogram'] = None
+        return stats
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"SELECT COUNT(age), AVG({AGE_AS_DOUBLE}), "
+            f"MIN({AGE_AS_DOUBLE}), MAX({AGE_AS_DOUBLE}) FROM user_data"
+        )
+        count, mean, minimum, maximum = cursor.fetchone()
+        stats = {'count': count, 'mean': mean, 'min': minimum, 'max': maximum}
+        if bin_width:
+            cursor.execute(
+                "SELECT FLOOR(age / %s) * %s AS bucket, COUNT(*) FROM user_data "
+                "GROUP BY bucket ORDER BY bucket",
+                (bin_width, bin_width),
+            )
+            stats['histogram'] = {float(bucket): n for bucket, n in cursor.fetchall()}
+        return stats
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def aggregate_ages_client(bin_width: float = None, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Computes the same statistics as aggregate_ages on the client, reducing
+    each fetched batch as a whole rather than row by row.
+    """
+    count = 0
+    total = 0.0
+    minimum = maximum = None
+    histogram = {}
+    for batch in stream_age_batches(batch_size):
+        if np is not None:
+            batch_total, batch_min, batch_max = batch.sum(), batch.min(), batch.max()
+        else:
+            batch_total, batch_min, batch_max = sum(batch), min(batch), max(batch)
+        count += len(batch)
+        total += float(batch_total)
+        minimum = batch_min if minimum is None else min(minimum, batch_min)
+        maximum = batch_max if maximum is None else max(maximum, batch_max)
+
+        if bin_width:
+            if np is not None:
+                buckets, counts = np.unique(
+                    np.floor(batch / bin_width) * bin_width, return_counts=True)
+                pairs = zip(buckets.tolist(), counts.tolist())
+            else:
+                batch_counts = {}
+                for age in batch:
+                    bucket = (age // bin_width) * bin_width
+                    batch_counts[bucket] = batch_counts.get(bucket, 0) + 1
+                pairs = batch_counts.items()
+            for bucket, n in pairs:
+                histogram[bucket] = histogram.get(bucket, 0) + n
+
+    stats = {
+        'count': count,
+        'mean': total / count if count else None,
+        'min': None if minimum is None else float(minimum),
+        'max': None if maximum is None else float(maximum),
+    }
+    if bin_width:
+        stats['histogram'] = dict(sorted(histogram.items()))
+    return stats
+
+
 def calculate_average_age():
-    total_age = 0.0
-    user_count = 0
-    
-    for age in stream_user_ages():
-        total_age += age
-        user_count += 1
-    
-    if user_count > 0:
-        average_age = total_age / user_count
+    average_age = aggregate_ages()['mean']
+
+    if average_age is not None:
         print(f"Average age of users: {average_age:.2f}")
     else:
         print("No users found to calculate the average age.")
+
+
+def benchmark(batch_size: int = BATCH_SIZE):
+    """
+    Times the average age computed row at a time, in client-side batches
+    and pushed down to SQL. Seed the table with seed.bulk_insert_data
+    first; the comparison is meant for tables of around 10M rows.
+    """
+    def row_at_a_time():
+        total = 0.0
+        count = 0
+        for age in stream_user_ages():
+            total += age
+            count += 1
+        return total / count if count else None
+
+    runs = [
+        ("row at a time", row_at_a_time),
+        ("batched", lambda: aggregate_ages_client(batch_size=batch_size)['mean']),
+        ("pushed down", lambda: aggregate_ages()['mean']),
+    ]
+    for label, run in runs:
+        start = time.perf_counter()
+        mean = run()
+        elapsed = time.perf_counter() - start
+        print(f"{label:>14}: {elapsed:8.3f}s  (mean {mean})")
+
+
+if __name__ == '__main__':
+    benchmark()
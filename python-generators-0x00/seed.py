@@ -2,6 +2,8 @@ import mysql.connector
 import csv
 import uuid
 import sys
+import time
+from itertools import islice
 
 
 DB_CONFIG = {
@@ -12,6 +14,11 @@ DB_CONFIG = {
 DB_NAME = 'ALX_prodev'
 TABLE_NAME = 'user_data'
 CSV_FILE = 'user_data.csv'
+COLUMNS = ('user_id', 'name', 'email', 'age')
+
+# Rows sent per executemany call, and rows inserted between commits.
+CHUNK_SIZE = 5000
+COMMIT_EVERY = 50000
 
 
 def connect_db() -> mysql.connector.MySQLConnection:
@@ -24,9 +31,14 @@ def connect_db() -> mysql.connector.MySQLConnection:
         print(f"Error connecting to MySQL: {err}")
         sys.exit(1)
 
-def connect_to_prodev() -> mysql.connector.MySQLConnection:
-    """Connects to the specified ALX_prodev database."""
+def connect_to_prodev(allow_local_infile: bool = False) -> mysql.connector.MySQLConnection:
+    """Connects to the specified ALX_prodev database.
+
+    allow_local_infile lets bulk_insert_data use LOAD DATA LOCAL INFILE.
+    """
     config_with_db = {**DB_CONFIG, 'database': DB_NAME}
+    if allow_local_infile:
+        config_with_db['allow_local_infile'] = True
     try:
         connection = mysql.connector.connect(**config_with_db)
         return connection
@@ -88,22 +100,106 @@ def load_csv_data(filepath: str) -> list[tuple]:
         print(f"An error occurred while processing CSV data: {e}")
         return []
 
+def iter_csv_chunks(csv_file: str, chunk_size: int = CHUNK_SIZE):
+    """Yields the CSV rows as lists of at most chunk_size insert tuples.
+
+    Only one chunk is held in memory at a time, whatever the file size.
+    """
+    with open(csv_file, newline='') as f:
+        rows = (
+            (row.get('user_id') or str(uuid.uuid4()), row['name'], row['email'], row['age'])
+            for row in csv.DictReader(f)
+        )
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def load_data_infile(connection: mysql.connector.MySQLConnection, csv_file: str) -> int:
+    """Loads the CSV with LOAD DATA LOCAL INFILE, letting the server parse it.
+
+    Columns are mapped from the CSV header; rows without a user_id get
+    one from UUID(). Requires a connection opened with allow_local_infile.
+    """
+    with open(csv_file, newline='') as f:
+        first_line = f.readline()
+    header = next(csv.reader([first_line]))
+    line_end = '\\r\\n' if first_line.endswith('\r\n') else '\\n'
+    targets = ", ".join(
+        column if column in COLUMNS else '@skip' for column in header)
+    set_user_id = "" if 'user_id' in header else " SET user_id = UUID()"
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE {TABLE_NAME} "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+            f"LINES TERMINATED BY '{line_end}' IGNORE 1 LINES "
+            f"({targets}){set_user_id}",
+            (csv_file,),
+        )
+        connection.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def bulk_insert_data(connection: mysql.connector.MySQLConnection, csv_file: str,
+                     chunk_size: int = CHUNK_SIZE, commit_every: int = COMMIT_EVERY,
+                     use_load_data: bool = False) -> int:
+    """Streams the CSV into user_data in chunks and returns the rows loaded.
+
+    Each chunk goes through a single executemany call, which the connector
+    rewrites into one multi-row INSERT, and the transaction is committed
+    every commit_every rows. With use_load_data the server-side
+    LOAD DATA LOCAL INFILE is tried first, falling back to chunked
+    inserts when the server or connection does not allow it.
+    """
+    start = time.perf_counter()
+    if use_load_data:
+        try:
+            total = load_data_infile(connection, csv_file)
+        except mysql.connector.Error as err:
+            print(f"LOAD DATA LOCAL INFILE unavailable, inserting in chunks: {err}")
+            connection.rollback()
+        else:
+            _report_rate(total, start)
+            return total
+
+    cursor = connection.cursor()
+    query = f"""
+        INSERT IGNORE INTO {TABLE_NAME} (user_id, name, email, age)
+        VALUES (%s, %s, %s, %s)
+    """
+    total = 0
+    uncommitted = 0
+    try:
+        for chunk in iter_csv_chunks(csv_file, chunk_size):
+            cursor.executemany(query, chunk)
+            total += len(chunk)
+            uncommitted += len(chunk)
+            if uncommitted >= commit_every:
+                connection.commit()
+                uncommitted = 0
+        connection.commit()
+    finally:
+        cursor.close()
+    _report_rate(total, start)
+    return total
+
+
+def _report_rate(rows: int, start: float):
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed > 0 else float('inf')
+    print(f"Inserted {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+
 def insert_data(connection: mysql.connector.MySQLConnection, csv_file: str):
     """Inserts data into the user_data table if it does not exist."""
-    cursor = connection.cursor()
-    with open(csv_file, newline='') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            user_id = row.get('user_id') or str(uuid.uuid4())
-            name = row['name']
-            email = row['email']
-            age = row['age']
-            try:
-                cursor.execute(f"""
-                    INSERT IGNORE INTO {TABLE_NAME} (user_id, name, email, age)
-                    VALUES (%s, %s, %s, %s)
-                """, (user_id, name, email, age))
-            except mysql.connector.Error as err:
-                print(f"Error inserting row: {err}")
-    connection.commit()
-    cursor.close()
+    try:
+        bulk_insert_data(connection, csv_file)
+    except mysql.connector.Error as err:
+        print(f"Error inserting rows: {err}")
+        connection.rollback()